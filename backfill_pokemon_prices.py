@@ -0,0 +1,120 @@
+import argparse
+import functools
+import os
+import tempfile
+from datetime import date, timedelta
+
+import py7zr
+from dotenv import load_dotenv
+from models.asset_handlers import AssetType, PokemonHandler
+from services.price_history import PriceHistoryStore
+from utils.config import supabase
+from utils.json_stream import iter_json_array_items
+
+load_dotenv()
+
+# TCGcsv started publishing daily archives on this date.
+FIRST_ARCHIVE_DATE = date(2024, 2, 8)
+
+
+def fetch_held_pokemon_products(handler):
+    """Returns {group_id: {product_id, ...}} for every Pokemon product held by any user."""
+    response = supabase.table('portfoliosv2')\
+        .select('symbol')\
+        .eq('asset_type', AssetType.POKEMON.value)\
+        .execute()
+
+    held = {}
+    for item in response.data or []:
+        parsed_ids = handler._parse_combined_id(item['symbol'])
+        if parsed_ids:
+            group_id, product_id = parsed_ids
+            held.setdefault(group_id, set()).add(product_id)
+    return held
+
+
+def backfill_day(handler, store, day, held):
+    """
+    Downloads one daily archive to a temporary file, extracts only the price
+    files of groups we hold, and streams through each one until every held
+    product of that group has been priced.
+    """
+    day_str = day.isoformat()
+    wanted_files = {
+        f"{day_str}/{handler.category_id}/{group_id}/prices": group_id
+        for group_id in held
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        archive_path = os.path.join(work_dir, 'prices.7z')
+        with open(archive_path, 'wb') as archive_file:
+            handler.download_price_archive(day_str, archive_file)
+
+        with py7zr.SevenZipFile(archive_path, mode='r') as archive:
+            targets = [name for name in archive.getnames() if name in wanted_files]
+            if not targets:
+                return 0
+            archive.extract(path=work_dir, targets=targets)
+        os.remove(archive_path)
+
+        found = 0
+        for name in targets:
+            product_ids = held[wanted_files[name]]
+            seen = set()
+            with open(os.path.join(work_dir, name), 'rb') as prices_file:
+                chunks = iter(functools.partial(prices_file.read, 64 * 1024), b'')
+                for price_info in iter_json_array_items(chunks, 'results'):
+                    product_id = str(price_info.get('productId'))
+                    # Same rule as the live price: the first subtype with a market price.
+                    if product_id not in product_ids or product_id in seen \
+                            or not handler.has_market_price(price_info):
+                        continue
+                    seen.add(product_id)
+                    store.add(f"{wanted_files[name]}:{product_id}", AssetType.POKEMON.value,
+                              day_str, float(price_info['marketPrice']))
+                    found += 1
+                    if len(seen) == len(product_ids):
+                        break
+        return found
+
+
+def backfill_pokemon_prices(start: date, end: date):
+    print(f"Backfilling Pokemon prices from {start} to {end}...")
+
+    handler = PokemonHandler()
+    held = fetch_held_pokemon_products(handler)
+    if not held:
+        print("No Pokemon products found in portfolios.")
+        return
+
+    store = PriceHistoryStore()
+    day = start
+    while day <= end:
+        try:
+            found = backfill_day(handler, store, day, held)
+            print(f"  {day}: {found} prices")
+        except Exception as e:
+            print(f"  {day}: skipped ({e})")
+        day += timedelta(days=1)
+
+    store.flush()
+    print(f"Backfill complete. {store.written} prices written to {store.TABLE}.")
+
+
+def parse_date(value: str) -> date:
+    return date.fromisoformat(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Backfill historical Pokemon prices from TCGcsv daily archives.")
+    parser.add_argument('--start', type=parse_date, default=FIRST_ARCHIVE_DATE,
+                        help="First day to backfill (YYYY-MM-DD).")
+    parser.add_argument('--end', type=parse_date, default=date.today() - timedelta(days=1),
+                        help="Last day to backfill (YYYY-MM-DD), defaults to yesterday.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    backfill_pokemon_prices(max(args.start, FIRST_ARCHIVE_DATE), args.end)
@@ -1,6 +1,10 @@
 from services.auth_service import AuthService
-from services.portfolio_manager import PortfolioManager
+from services.local_replica import LocalReplica
+from services.tax_lots import TaxLotService
 from models.asset_handlers import AssetHandlerFactory, AssetType
+from models.tax_lots import LOT_METHODS
+from utils.profiling import profiler, add_profile_arguments
+import argparse
 import os
 
 
@@ -9,8 +13,78 @@ def initialize_services():
     AssetHandlerFactory.initialize(polygon_api_key)
 
 
+VIEW_COLUMNS = ("asset_type", "symbol", "asset_name", "quantity", "current_price")
+HOLDINGS_COLUMNS = ("asset_type", "symbol", "quantity")
+
+PORTFOLIO_SECTIONS = (
+    (AssetType.STOCK, "STOCKS"),
+    (AssetType.CRYPTO, "CRYPTO"),
+    (AssetType.POKEMON, "POKEMON PRODUCTS"),
+)
+
+
+def profiled_pages(pages):
+    """Fetches each page inside the 'fetch_holdings' phase while rendering streams."""
+    while True:
+        with profiler.phase('fetch_holdings'):
+            page = next(pages, None)
+        if page is None:
+            return
+        yield page
+
+
+def print_portfolio(portfolio, user_id: str) -> int:
+    """Streams the portfolio section by section, one page at a time. Returns the asset count."""
+    print("\n=== Your Portfolio ===")
+    total_assets = 0
+    total_portfolio_value = 0
+
+    for asset_type, title in PORTFOLIO_SECTIONS:
+        section_assets = 0
+        section_value = 0
+        pages = portfolio.iter_portfolio(user_id, VIEW_COLUMNS, asset_type=asset_type.value)
+
+        for page in profiled_pages(pages):
+            if not section_assets:
+                print(f"\n{title}")
+            for asset in page:
+                if asset_type == AssetType.POKEMON:
+                    print(
+                        f"   {asset['asset_name']} (Product ID: {asset['symbol']})")
+                else:
+                    print(f"   {asset['asset_name']} ({asset['symbol']})")
+                print(f"   Quantity: {asset['quantity']}")
+                if asset.get('current_price'):
+                    asset_value = asset['current_price'] * \
+                        asset['quantity']
+                    print(f"   Price: ${asset['current_price']:.2f}")
+                    print(f"   Total Value: ${asset_value:.2f}")
+                    section_value += asset_value
+                print()
+            section_assets += len(page)
+
+        if section_assets:
+            print(f"{title}: {section_assets} assets, ${section_value:.2f}")
+        total_assets += section_assets
+        total_portfolio_value += section_value
+
+    if not total_assets:
+        return 0
+
+    print(f"\nTotal Assets: {total_assets}")
+    if total_portfolio_value > 0:
+        print(
+            f"Total Portfolio Value: ${total_portfolio_value:.2f}")
+    return total_assets
+
+
 def handle_portfolio_operations(user_id: str):
-    portfolio = PortfolioManager()
+    portfolio = LocalReplica()
+    lots = TaxLotService(portfolio)
+    with profiler.phase('fetch_holdings'):
+        synced = portfolio.sync(user_id)
+    if not synced:
+        print("Working offline; changes will be pushed on the next sync.")
 
     while True:
         print("\n=== Portfolio Management ===")
@@ -20,9 +94,11 @@ def handle_portfolio_operations(user_id: str):
         print("4. View Your Portfolio")
         print("5. Update Asset in Portfolio")
         print("6. Delete Asset from Portfolio")
-        print("7. Return to Main Menu")
+        print("7. Record Buy/Sell Transaction")
+        print("8. View Cost Basis & Gains")
+        print("9. Return to Main Menu")
 
-        choice = input("\nSelect an option (1-7): ")
+        choice = input("\nSelect an option (1-9): ")
 
         if choice == "1":
             symbol = input("Enter stock symbol (e.g., AAPL): ")
@@ -30,8 +106,9 @@ def handle_portfolio_operations(user_id: str):
                 quantity = float(input("Enter quantity: "))
 
                 print(f"Validating stock symbol '{symbol}'...")
-                validation_result = AssetHandlerFactory.validate_asset(
-                    AssetType.STOCK, symbol)
+                with profiler.phase('fetch_prices'):
+                    validation_result = AssetHandlerFactory.validate_asset(
+                        AssetType.STOCK, symbol)
 
                 if not validation_result.is_valid:
                     print(f"Error: {validation_result.error_message}")
@@ -64,8 +141,9 @@ def handle_portfolio_operations(user_id: str):
                 quantity = float(input("Enter quantity: "))
 
                 print(f"Validating crypto symbol '{symbol}'...")
-                validation_result = AssetHandlerFactory.validate_asset(
-                    AssetType.CRYPTO, symbol)
+                with profiler.phase('fetch_prices'):
+                    validation_result = AssetHandlerFactory.validate_asset(
+                        AssetType.CRYPTO, symbol)
 
                 if not validation_result.is_valid:
                     print(f"Error: {validation_result.error_message}")
@@ -103,8 +181,9 @@ def handle_portfolio_operations(user_id: str):
 
                 print(
                     f"Validating Pokemon product (Group ID: {group_id}, Product ID: {product_id})...")
-                validation_result = AssetHandlerFactory.validate_pokemon_asset_inputs(
-                    group_id, product_id)
+                with profiler.phase('fetch_prices'):
+                    validation_result = AssetHandlerFactory.validate_pokemon_asset_inputs(
+                        group_id, product_id)
 
                 if not validation_result.is_valid:
                     print(f"Error: {validation_result.error_message}")
@@ -132,67 +211,18 @@ def handle_portfolio_operations(user_id: str):
 
         elif choice == "4":
             print("\nFetching your portfolio...")
-            result = portfolio.view_portfolio(user_id)
-            if result and result.data:
-                print(f"\n=== Your Portfolio ({len(result.data)} assets) ===")
-                total_portfolio_value = 0
-
-                stocks = [
-                    asset for asset in result.data if asset['asset_type'] == 'stock']
-                cryptos = [
-                    asset for asset in result.data if asset['asset_type'] == 'crypto']
-                pokemons = [
-                    asset for asset in result.data if asset['asset_type'] == 'pokemon']
-
-                if stocks:
-                    print(f"\nSTOCKS ({len(stocks)})")
-                    for asset in stocks:
-                        print(f"   {asset['asset_name']} ({asset['symbol']})")
-                        print(f"   Quantity: {asset['quantity']}")
-                        if asset.get('current_price'):
-                            asset_value = asset['current_price'] * \
-                                asset['quantity']
-                            print(f"   Price: ${asset['current_price']:.2f}")
-                            print(f"   Total Value: ${asset_value:.2f}")
-                            total_portfolio_value += asset_value
-                        print()
-
-                if cryptos:
-                    print(f"\nCRYPTO ({len(cryptos)})")
-                    for asset in cryptos:
-                        print(f"   {asset['asset_name']} ({asset['symbol']})")
-                        print(f"   Quantity: {asset['quantity']}")
-                        if asset.get('current_price'):
-                            asset_value = asset['current_price'] * \
-                                asset['quantity']
-                            print(f"   Price: ${asset['current_price']:.2f}")
-                            print(f"   Total Value: ${asset_value:.2f}")
-                            total_portfolio_value += asset_value
-                        print()
-                
-                if pokemons:
-                    print(f"\nPOKEMON PRODUCTS ({len(pokemons)})")
-                    for asset in pokemons:
-                        print(
-                            f"   {asset['asset_name']} (Product ID: {asset['symbol']})")
-                        print(f"   Quantity: {asset['quantity']}")
-                        if asset.get('current_price'):
-                            asset_value = asset['current_price'] * \
-                                asset['quantity']
-                            print(f"   Price: ${asset['current_price']:.2f}")
-                            print(f"   Total Value: ${asset_value:.2f}")
-                            total_portfolio_value += asset_value
-                        print()
-
-                if total_portfolio_value > 0:
-                    print(
-                        f"Total Portfolio Value: ${total_portfolio_value:.2f}")
-            else:
+            try:
+                with profiler.phase('rendering'):
+                    asset_count = print_portfolio(portfolio, user_id)
+            except Exception as e:
+                print(f"\nCould not load the rest of your portfolio; the listing above is incomplete: {str(e)}")
+                continue
+            if not asset_count:
                 print("No assets found in your portfolio")
 
         elif choice == "5":
             print("\nFetching your portfolio...")
-            current_portfolio = portfolio.view_portfolio(user_id)
+            current_portfolio = portfolio.view_portfolio(user_id, HOLDINGS_COLUMNS)
 
             if not current_portfolio or not current_portfolio.data:
                 print("No assets found in your portfolio")
@@ -232,7 +262,7 @@ def handle_portfolio_operations(user_id: str):
 
         elif choice == "6":
             print("\nFetching your portfolio...")
-            current_portfolio = portfolio.view_portfolio(user_id)
+            current_portfolio = portfolio.view_portfolio(user_id, HOLDINGS_COLUMNS)
 
             if not current_portfolio or not current_portfolio.data:
                 print("No assets found in your portfolio")
@@ -268,9 +298,94 @@ def handle_portfolio_operations(user_id: str):
                 print(f"An error occurred: {str(e)}")
 
         elif choice == "7":
+            current_portfolio = portfolio.view_portfolio(user_id, HOLDINGS_COLUMNS)
+            if not current_portfolio or not current_portfolio.data:
+                print("No assets found in your portfolio. Add the asset first.")
+                continue
+
+            side = input(
+                "Buy, sell, or record an opening lot for units you already hold? (buy/sell/open): ").lower()
+            if side not in ('buy', 'sell', 'open'):
+                print("Error: Please enter 'buy', 'sell' or 'open'")
+                continue
+
+            symbol = input(
+                "Enter the symbol (e.g., AAPL, BTC): ").upper()
+            holding = next(
+                (asset for asset in current_portfolio.data if asset['symbol'] == symbol), None)
+            if not holding:
+                print(f"Error: You don't own any {symbol}. Add it first.")
+                continue
+
+            try:
+                quantity = float(input("Enter quantity: "))
+                price = float(input("Enter price per unit: "))
+                if quantity <= 0 or price < 0:
+                    print("Error: Quantity must be positive and price cannot be negative")
+                    continue
+
+                if side == 'buy':
+                    with profiler.phase('db_writes'):
+                        lots.record_buy(user_id, holding, quantity, price)
+                    print(f"Recorded buy of {quantity} {symbol} at ${price:.2f}")
+                elif side == 'open':
+                    acquired_at = input("Enter the date you acquired them (YYYY-MM-DD): ").strip()
+                    with profiler.phase('db_writes'):
+                        lots.record_opening_lot(
+                            user_id, holding['asset_type'], symbol, quantity, price, acquired_at)
+                    print(f"Recorded opening lot of {quantity} {symbol} at ${price:.2f} "
+                          f"acquired {acquired_at}; holding unchanged")
+                else:
+                    method = input(
+                        f"Lot matching method ({'/'.join(LOT_METHODS)}) [fifo]: ").lower() or 'fifo'
+                    with profiler.phase('db_writes'):
+                        gains = lots.record_sell(
+                            user_id, holding['asset_type'], symbol, quantity, price, method)
+                    realized = sum(gain.gain for gain in gains)
+                    print(
+                        f"Recorded sale of {quantity} {symbol} across {len(gains)} lots. Realized gain: ${realized:.2f}")
+
+            except ValueError as e:
+                print(f"Error: {e}")
+            except Exception as e:
+                print(f"An error occurred: {str(e)}")
+
+        elif choice == "8":
+            try:
+                with profiler.phase('fetch_holdings'):
+                    report = lots.profit_and_loss(user_id)
+            except Exception as e:
+                print(f"An error occurred: {str(e)}")
+                continue
+
+            if not report:
+                print("No transactions recorded yet")
+                continue
+
+            print("\n=== Cost Basis & Gains ===")
+            for symbol, values in sorted(report.items()):
+                print(f"   {symbol}")
+                print(f"   Open Quantity: {values['quantity']}")
+                print(f"   Cost Basis: ${values['cost_basis']:.2f}")
+                if values['unrealized_pnl'] is not None:
+                    print(f"   Unrealized P&L: ${values['unrealized_pnl']:.2f}")
+                print(f"   Realized P&L: ${values['realized_pnl']:.2f}")
+                print()
+
+        elif choice == "9":
+            if portfolio.pending_count(user_id):
+                print("\nPushing pending changes...")
+                with profiler.phase('db_writes'):
+                    portfolio.sync(user_id)
             break
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Portfolio Manager CLI")
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
 def main():
     initialize_services()
     auth = AuthService()
@@ -309,4 +424,11 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.profile:
+        profiler.enable(args.profile, args.profile_dir, prefix='cli')
+    try:
+        main()
+    finally:
+        for report_path in profiler.write_reports():
+            print(f"Profile written to {report_path}")
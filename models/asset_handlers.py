@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Callable, Dict, Any, List, Set, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 from enum import Enum
+from utils.json_stream import iter_json_array_items
 import os
 
 
@@ -40,6 +42,10 @@ class AssetHandler(ABC):
         pass
 
 class PolygonBaseHandler(AssetHandler):
+    snapshot_endpoint = None
+    snapshot_batch_size = 250
+    request_timeout = 10
+
     def __init__(self, api_key:str = None, asset_type: AssetType = None):
         self.api_key = api_key or os.getenv('POLYGON_API_KEY')
         if not self.api_key:
@@ -53,25 +59,66 @@ class PolygonBaseHandler(AssetHandler):
     def _make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
         try:
             url = f"{self.base_url}{endpoint}"
-            response = self.session.get(url, params=params or {})
+            response = self.session.get(url, params=params or {}, timeout=self.request_timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             raise Exception(f"API request failed: {str(e)}")
         
+    def _fetch_price_data(self, formatted_symbol: str) -> Optional[float]:
+        price_endpoint = f"/v2/aggs/ticker/{formatted_symbol}/prev"
+        price_data = self._make_request(price_endpoint)
+
+        if price_data.get('status') == 'OK' and price_data.get('results'):
+            return float(price_data['results'][0]['c'])
+        return None
+
     def _get_price_data(self, formatted_symbol: str) -> Optional[float]:
         try:
-            price_endpoint = f"/v2/aggs/ticker/{formatted_symbol}/prev"
-            price_data = self._make_request(price_endpoint)
-
-            if price_data.get('status') == 'OK' and price_data.get('results'):
-                return float(price_data['results'][0]['c'])
-            return None
+            return self._fetch_price_data(formatted_symbol)
         except Exception as e:
             print(f"Error getting price for {formatted_symbol}: {e}")
             return None
 
+    def fetch_current_price(self, symbol: str) -> Optional[float]:
+        """Like get_current_price, but a failed request raises instead of returning None."""
+        return self._fetch_price_data(self.format_symbol(symbol))
+
+    @staticmethod
+    def _snapshot_price(ticker_data: Dict[str, Any]) -> Optional[float]:
+        candidates = (
+            ticker_data.get('lastTrade', {}).get('p'),
+            ticker_data.get('min', {}).get('c'),
+            ticker_data.get('day', {}).get('c'),
+            ticker_data.get('prevDay', {}).get('c'),
+        )
+        for price in candidates:
+            if price:
+                return float(price)
+        return None
+
+    def get_snapshot_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """Fetches current prices for many symbols with one snapshot request per batch."""
+        tickers = {self.format_symbol(symbol): symbol for symbol in symbols}
+        ticker_list = list(tickers)
+        prices = {}
+
+        for start in range(0, len(ticker_list), self.snapshot_batch_size):
+            batch = ticker_list[start:start + self.snapshot_batch_size]
+            snapshot = self._make_request(
+                self.snapshot_endpoint, {'tickers': ','.join(batch)})
+
+            for ticker_data in snapshot.get('tickers') or []:
+                symbol = tickers.get(ticker_data.get('ticker'))
+                price = self._snapshot_price(ticker_data)
+                if symbol and price is not None:
+                    prices[symbol] = price
+
+        return prices
+
 class PolygonStockHandler(PolygonBaseHandler):
+    snapshot_endpoint = "/v2/snapshot/locale/us/markets/stocks/tickers"
+
     def __init__(self, api_key: str = None):
         super().__init__(api_key=api_key, asset_type=AssetType.STOCK)
 
@@ -135,6 +182,8 @@ class PolygonStockHandler(PolygonBaseHandler):
 
 
 class PolygonCryptoHandler(PolygonBaseHandler):
+    snapshot_endpoint = "/v2/snapshot/locale/global/markets/crypto/tickers"
+
     def __init__(self, api_key: str = None):
         super().__init__(api_key=api_key, asset_type=AssetType.CRYPTO)
 
@@ -203,19 +252,60 @@ class PolygonCryptoHandler(PolygonBaseHandler):
 
 
 class TcgcsvBaseHandler(AssetHandler):
+    request_timeout = 10
+
     def __init__(self):
         self.base_url = "https://tcgcsv.com"
         self.session = requests.Session()
 
-    def _make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    def _stream_results(self, endpoint: str, product_ids: Set[str],
+                        fields: Tuple[str, ...] = None,
+                        accept: Callable[[Dict[str, Any]], bool] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Parses the `results` array of a group payload one item at a time, keeping
+        the first accepted item (or just `fields` of it) per wanted productId,
+        and stops reading the response once every wanted product is found.
+        An unknown group has no items; any other failed request raises.
+        """
+        found = {}
+        if not product_ids:
+            return found
         try:
             url = f"{self.base_url}{endpoint}"
-            response = self.session.get(url, params=params or {})
-            response.raise_for_status()
-            return response.json()
+            with self.session.get(url, stream=True, timeout=self.request_timeout) as response:
+                if response.status_code == 404:
+                    return found
+                response.raise_for_status()
+                for item in iter_json_array_items(response.iter_content(chunk_size=64 * 1024), 'results'):
+                    product_id = str(item.get('productId'))
+                    if product_id not in product_ids or product_id in found:
+                        continue
+                    if accept and not accept(item):
+                        continue
+                    found[product_id] = {field: item.get(field) for field in fields} if fields else item
+                    if len(found) == len(product_ids):
+                        break
+            return found
         except requests.exceptions.RequestException as e:
             raise Exception(f"TCGCsv API request failed: {str(e)}")
 
+    def download_price_archive(self, date: str, file_obj, chunk_size: int = 1024 * 1024) -> int:
+        """
+        Streams the daily price archive for `date` (YYYY-MM-DD) into `file_obj`
+        chunk by chunk, returning the number of bytes written.
+        """
+        try:
+            url = f"{self.base_url}/archive/tcgplayer/prices-{date}.ppmd.7z"
+            written = 0
+            with self.session.get(url, stream=True, timeout=self.request_timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    file_obj.write(chunk)
+                    written += len(chunk)
+            return written
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"TCGCsv archive download failed: {str(e)}")
+
     @abstractmethod
     def validate_symbol(self, symbol: str) -> bool:
         pass
@@ -234,6 +324,8 @@ class TcgcsvBaseHandler(AssetHandler):
 
 
 class PokemonHandler(TcgcsvBaseHandler):
+    category_id = "3"
+
     def __init__(self):
         super().__init__()
         self.asset_type = AssetType.POKEMON
@@ -252,27 +344,36 @@ class PokemonHandler(TcgcsvBaseHandler):
 
     def _get_product_details(self, group_id: str, product_id: str) -> Optional[Dict[str, Any]]:
         try:
-            endpoint = f"/tcgplayer/3/{group_id}/products"
-            response_data = self._make_request(endpoint)
-            products = response_data.get('results', [])
-            for product in products:
-                if str(product.get('productId')) == product_id:
-                    return product
-            return None
+            endpoint = f"/tcgplayer/{self.category_id}/{group_id}/products"
+            products = self._stream_results(endpoint, {product_id})
+            return products.get(product_id)
         except Exception as e:
             return None
 
-    def _get_price_details(self, group_id: str, product_id: str) -> Optional[float]:
+    @staticmethod
+    def has_market_price(price_info: Dict[str, Any]) -> bool:
+        """
+        A product has one price row per subtype (normal, holofoil, ...); the
+        first row with a market price is the product's price.
+        """
+        return price_info.get('marketPrice') is not None
+
+    def _fetch_group_prices(self, group_id: str, product_ids: Set[str]) -> Dict[str, float]:
+        """Market prices for several products of one group from a single request."""
+        endpoint = f"/tcgplayer/{self.category_id}/{group_id}/prices"
+        prices = self._stream_results(
+            endpoint, product_ids, fields=('marketPrice',), accept=self.has_market_price)
+        return {product_id: float(price_info['marketPrice'])
+                for product_id, price_info in prices.items()}
+
+    def _get_group_prices(self, group_id: str, product_ids: Set[str]) -> Dict[str, float]:
         try:
-            endpoint = f"/tcgplayer/3/{group_id}/prices"
-            response_data = self._make_request(endpoint)
-            prices = response_data.get('results', [])
-            for price_info in prices:
-                if str(price_info.get('productId')) == product_id:
-                    return float(price_info.get('marketPrice'))
-            return None
+            return self._fetch_group_prices(group_id, product_ids)
         except Exception as e:
-            return None
+            return {}
+
+    def _get_price_details(self, group_id: str, product_id: str) -> Optional[float]:
+        return self._get_group_prices(group_id, {product_id}).get(product_id)
 
     def validate_and_enrich_from_inputs(self, group_id_input: str, product_id_input: str) -> ValidationResult:
         if not group_id_input.isdigit() or not product_id_input.isdigit():
@@ -341,18 +442,48 @@ class PokemonHandler(TcgcsvBaseHandler):
             return None
         group_id, product_id = parsed_ids
         return self._get_price_details(group_id, product_id)
-    
+
+    def fetch_current_price(self, symbol: str) -> Optional[float]:
+        """Like get_current_price, but a failed request raises instead of returning None."""
+        parsed_ids = self._parse_combined_id(symbol)
+        if not parsed_ids:
+            return None
+        group_id, product_id = parsed_ids
+        return self._fetch_group_prices(group_id, {product_id}).get(product_id)
+
+    def get_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        Prices for many 'GROUPID:PRODUCTID' symbols with one request per group.
+        A failed group request raises, so callers can tell it from unknown products.
+        """
+        wanted = {}
+        for symbol in symbols:
+            parsed_ids = self._parse_combined_id(symbol)
+            if parsed_ids:
+                wanted.setdefault(parsed_ids[0], set()).add(parsed_ids[1])
+
+        prices = {}
+        for group_id, product_ids in wanted.items():
+            for product_id, price in self._fetch_group_prices(group_id, product_ids).items():
+                prices[f"{group_id}:{product_id}"] = price
+        return prices
+
 
 class AssetHandlerFactory:
     _handlers = {}
 
     @classmethod
-    def initialize(cls, polygon_api_key: str = None):
+    def initialize(cls, polygon_api_key: str = None, pool_size: int = None):
         cls._handlers = {
             AssetType.STOCK: PolygonStockHandler(api_key=polygon_api_key),
             AssetType.CRYPTO: PolygonCryptoHandler(api_key=polygon_api_key),
             AssetType.POKEMON: PokemonHandler()
         }
+        if pool_size:
+            # Let concurrent callers share each handler's keep-alive connections.
+            for handler in cls._handlers.values():
+                handler.session.mount(
+                    'https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
 
     @classmethod
     def get_handler(cls, asset_type: AssetType) -> Optional[AssetHandler]:
@@ -0,0 +1,333 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple
+import csv
+import os
+import threading
+import time
+
+import requests
+
+from models.asset_handlers import AssetHandlerFactory, AssetType
+
+# The Polygon rate limit is 5 requests per minute, so 1 request every 12 seconds (60/5).
+POLYGON_MIN_INTERVAL_SECONDS = 13
+
+
+class RateLimiter:
+    """
+    Spaces out calls to one upstream API. Everything that uses the same API
+    key must share one instance, so falling back between providers (or
+    serving concurrent requests) stays in the limit.
+    """
+
+    def __init__(self, min_interval_seconds: float):
+        self.min_interval_seconds = min_interval_seconds
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, calls: int = 1, max_wait: float = None) -> bool:
+        """
+        Reserves room for `calls` back-to-back requests and sleeps until they
+        may start. With `max_wait`, returns False without reserving anything
+        when the wait would be longer.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            if max_wait is not None and slot - now > max_wait:
+                return False
+            self._next_slot = slot + calls * self.min_interval_seconds
+        if slot > now:
+            time.sleep(slot - now)
+        return True
+
+
+class PriceProvider(ABC):
+    """
+    A source of current prices for one or more asset types. `expected_latency`
+    is a per-symbol guess used until the registry has measured the provider.
+    """
+
+    name = "provider"
+    expected_latency = 1.0
+
+    def __init__(self, asset_types: Tuple[AssetType, ...], rate_limiter: RateLimiter = None):
+        self.asset_types = tuple(asset_types)
+        self.rate_limiter = rate_limiter
+
+    def _throttle(self):
+        """Waits for the upstream's rate limit, if the provider has one."""
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+
+    @abstractmethod
+    def get_prices(self, asset_type: AssetType, symbols: List[str]) -> Dict[str, float]:
+        pass
+
+
+class HandlerPriceProvider(PriceProvider):
+    """
+    Looks prices up one symbol at a time through an asset handler. A failed
+    request raises, so the registry counts it as an error rather than as
+    symbols the upstream does not know.
+    """
+
+    def __init__(self, name: str, asset_types: Tuple[AssetType, ...],
+                 rate_limiter: RateLimiter = None, expected_latency: float = 1.0):
+        super().__init__(asset_types, rate_limiter)
+        self.name = name
+        self.expected_latency = expected_latency
+
+    def get_prices(self, asset_type: AssetType, symbols: List[str]) -> Dict[str, float]:
+        handler = AssetHandlerFactory.get_handler(asset_type)
+        if not handler:
+            raise Exception(f"No handler for asset type: {asset_type}")
+
+        prices = {}
+        for symbol in symbols:
+            self._throttle()
+            price = handler.fetch_current_price(symbol)
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+
+class PolygonSnapshotProvider(PriceProvider):
+    """Batches stock and crypto symbols through Polygon's snapshot endpoints."""
+
+    name = "polygon-snapshot"
+    expected_latency = 0.05
+
+    def __init__(self, rate_limiter: RateLimiter = None):
+        super().__init__((AssetType.STOCK, AssetType.CRYPTO), rate_limiter)
+
+    def get_prices(self, asset_type: AssetType, symbols: List[str]) -> Dict[str, float]:
+        self._throttle()
+        return AssetHandlerFactory.get_handler(asset_type).get_snapshot_prices(symbols)
+
+
+class PokemonGroupProvider(PriceProvider):
+    """Fetches each TCGcsv group's price list once for all requested products."""
+
+    name = "tcgcsv"
+    expected_latency = 0.5
+
+    def __init__(self):
+        super().__init__((AssetType.POKEMON,))
+
+    def get_prices(self, asset_type: AssetType, symbols: List[str]) -> Dict[str, float]:
+        return AssetHandlerFactory.get_handler(AssetType.POKEMON).get_prices(symbols)
+
+
+class CsvPriceProvider(PriceProvider):
+    """
+    Reads prices from a local CSV file with `symbol,asset_type,price` columns,
+    reloading it whenever the file changes.
+    """
+
+    name = "csv"
+    expected_latency = 0.001
+
+    def __init__(self, path: str, asset_types: Tuple[AssetType, ...] = tuple(AssetType)):
+        super().__init__(asset_types)
+        self.path = path
+        self._mtime = None
+        self._prices: Dict[Tuple[str, str], float] = {}
+
+    def _reload(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return
+        prices = {}
+        with open(self.path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    prices[(row['asset_type'].strip().lower(), row['symbol'].strip().upper())] = \
+                        float(row['price'])
+                except (KeyError, ValueError, AttributeError):
+                    continue
+        self._prices = prices
+        self._mtime = mtime
+
+    def get_prices(self, asset_type: AssetType, symbols: List[str]) -> Dict[str, float]:
+        self._reload()
+        prices = {}
+        for symbol in symbols:
+            price = self._prices.get((asset_type.value, symbol.upper()))
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+
+class HttpJsonPriceProvider(PriceProvider):
+    """
+    Generic HTTP source. `url_template` may use {asset_type} and {symbols}
+    (comma separated); the response must be a {symbol: price} object or a
+    list of {"symbol", "price"} objects.
+    """
+
+    expected_latency = 0.5
+
+    def __init__(self, name: str, url_template: str,
+                 asset_types: Tuple[AssetType, ...] = tuple(AssetType), timeout: float = 10.0):
+        super().__init__(asset_types)
+        self.name = name
+        self.url_template = url_template
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def get_prices(self, asset_type: AssetType, symbols: List[str]) -> Dict[str, float]:
+        url = self.url_template.format(asset_type=asset_type.value, symbols=','.join(symbols))
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"{self.name} request failed: {str(e)}")
+
+        if isinstance(data, list):
+            data = {item.get('symbol'): item.get('price') for item in data if isinstance(item, dict)}
+
+        wanted = {symbol.upper(): symbol for symbol in symbols}
+        prices = {}
+        for symbol, price in data.items():
+            if symbol and symbol.upper() in wanted and price is not None:
+                prices[wanted[symbol.upper()]] = float(price)
+        return prices
+
+
+class ProviderStats:
+    """
+    Rolling per-symbol latency and error rate for one provider. A call that
+    succeeds but does not know some symbols is not an error; those symbols
+    are only counted in `unknown_symbols`.
+    """
+
+    def __init__(self, window: int = 20, max_error_rate: float = 0.5,
+                 min_samples: int = 3, cooldown_seconds: float = 300):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown_seconds = cooldown_seconds
+        self.cooldown_until = 0.0
+        self.unknown_symbols = 0
+
+    @property
+    def average_latency(self) -> Optional[float]:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else None
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def record_success(self, seconds: float, returned: int, requested: int):
+        # Latency is per symbol actually priced; an empty answer says nothing about speed.
+        if returned:
+            self.latencies.append(seconds / returned)
+        self.outcomes.append(True)
+        self.unknown_symbols += requested - returned
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        if len(self.outcomes) >= self.min_samples and self.error_rate >= self.max_error_rate:
+            self.cooldown_until = time.monotonic() + self.cooldown_seconds
+            self.outcomes.clear()
+
+
+class PriceProviderRegistry:
+    """
+    Holds several providers per asset type. Each batch goes to the fastest
+    healthy provider first; symbols it fails on or does not know fall through
+    to the next one. Providers in cooldown are only tried as a last resort.
+    """
+
+    def __init__(self):
+        self._providers: Dict[AssetType, List[PriceProvider]] = {}
+        self.stats: Dict[str, ProviderStats] = {}
+
+    def register(self, provider: PriceProvider):
+        for asset_type in provider.asset_types:
+            self._providers.setdefault(asset_type, []).append(provider)
+        self.stats.setdefault(provider.name, ProviderStats())
+        return provider
+
+    def providers_for(self, asset_type: AssetType) -> List[PriceProvider]:
+        def latency(provider):
+            measured = self.stats[provider.name].average_latency
+            return measured if measured is not None else provider.expected_latency
+
+        providers = self._providers.get(asset_type, [])
+        healthy = [p for p in providers if self.stats[p.name].healthy]
+        cooling = [p for p in providers if not self.stats[p.name].healthy]
+        return sorted(healthy, key=latency) + sorted(cooling, key=latency)
+
+    def fetch_prices(self, asset_type: AssetType, symbols: List[str]) -> Tuple[Dict[str, float], Dict[str, str]]:
+        """Returns ({symbol: price}, {symbol: provider name}) for the symbols that could be priced."""
+        prices, sources = {}, {}
+        remaining = list(dict.fromkeys(symbols))
+
+        for provider in self.providers_for(asset_type):
+            if not remaining:
+                break
+            stats = self.stats[provider.name]
+            started = time.monotonic()
+            try:
+                found = provider.get_prices(asset_type, remaining)
+            except Exception as e:
+                print(f"  Price provider {provider.name} failed: {e}")
+                stats.record_failure()
+                continue
+
+            returned = 0
+            for symbol, price in found.items():
+                if symbol in remaining and symbol not in prices:
+                    prices[symbol] = price
+                    sources[symbol] = provider.name
+                    returned += 1
+            stats.record_success(time.monotonic() - started, returned, len(remaining))
+            remaining = [symbol for symbol in remaining if symbol not in prices]
+
+        return prices, sources
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": name,
+                "average_latency": stats.average_latency,
+                "error_rate": stats.error_rate,
+                "unknown_symbols": stats.unknown_symbols,
+                "healthy": stats.healthy,
+            }
+            for name, stats in self.stats.items()
+        ]
+
+
+def build_default_registry() -> PriceProviderRegistry:
+    """
+    Polygon and TCGcsv as the baseline, plus optional sources configured via
+    environment variables:
+      POLYGON_SNAPSHOTS=1       batch stock/crypto prices through snapshot endpoints
+      PRICE_CSV_PATH=prices.csv local CSV of symbol,asset_type,price
+      PRICE_HTTP_URL=https://.../prices?type={asset_type}&symbols={symbols}
+    """
+    registry = PriceProviderRegistry()
+    # Both Polygon providers use the same API key, so they share one limiter.
+    polygon_limiter = RateLimiter(POLYGON_MIN_INTERVAL_SECONDS)
+    registry.register(HandlerPriceProvider(
+        "polygon", (AssetType.STOCK, AssetType.CRYPTO),
+        rate_limiter=polygon_limiter, expected_latency=13))
+    registry.register(PokemonGroupProvider())
+
+    if os.getenv('POLYGON_SNAPSHOTS') == '1':
+        registry.register(PolygonSnapshotProvider(polygon_limiter))
+    if os.getenv('PRICE_CSV_PATH'):
+        registry.register(CsvPriceProvider(os.getenv('PRICE_CSV_PATH')))
+    if os.getenv('PRICE_HTTP_URL'):
+        registry.register(HttpJsonPriceProvider("http", os.getenv('PRICE_HTTP_URL')))
+    return registry
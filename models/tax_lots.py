@@ -0,0 +1,141 @@
+from datetime import datetime, timezone
+from typing import Dict, List
+import heapq
+
+LOT_METHODS = ('fifo', 'lifo', 'hifo')
+
+# Quantities below this are treated as zero to absorb float rounding.
+QUANTITY_EPSILON = 1e-9
+
+
+def acquired_timestamp(acquired_at: str) -> float:
+    """Seconds since the epoch for an ISO date or timestamp; one without an offset is taken as UTC."""
+    acquired = datetime.fromisoformat(acquired_at)
+    if acquired.tzinfo is None:
+        acquired = acquired.replace(tzinfo=timezone.utc)
+    return acquired.timestamp()
+
+
+class Lot:
+    __slots__ = ('seq', 'symbol', 'quantity', 'remaining', 'price', 'acquired_at')
+
+    def __init__(self, seq: int, symbol: str, quantity: float, price: float, acquired_at: str,
+                 remaining: float = None):
+        self.seq = seq
+        self.symbol = symbol
+        self.quantity = quantity
+        self.remaining = quantity if remaining is None else remaining
+        self.price = price
+        self.acquired_at = acquired_at
+
+
+class RealizedGain:
+    __slots__ = ('lot', 'symbol', 'quantity', 'cost_basis', 'proceeds', 'acquired_at', 'sold_at')
+
+    def __init__(self, lot: Lot, quantity: float, proceeds: float, sold_at: str):
+        self.lot = lot
+        self.symbol = lot.symbol
+        self.quantity = quantity
+        self.cost_basis = quantity * lot.price
+        self.proceeds = proceeds
+        self.acquired_at = lot.acquired_at
+        self.sold_at = sold_at
+
+    @property
+    def gain(self) -> float:
+        return self.proceeds - self.cost_basis
+
+
+class LotBook:
+    """
+    Open lots per symbol. Every lot sits in one heap per matching method
+    (FIFO, LIFO, HIFO), so any sale pops the right lot in O(log n). FIFO and
+    LIFO go by acquisition date, then by `seq` for lots acquired together. Lots
+    consumed through one heap stay in the others and are skipped lazily
+    when they surface. Open quantity and cost are kept as running totals,
+    so valuing the book never has to walk the lots.
+    """
+
+    def __init__(self):
+        self._heaps: Dict[str, Dict[str, list]] = {}
+        self._seq = 0
+        self.open_quantity: Dict[str, float] = {}
+        self.open_cost: Dict[str, float] = {}
+
+    def add(self, lot: Lot) -> Lot:
+        """Adds an existing lot, e.g. one loaded from storage."""
+        if lot.remaining <= QUANTITY_EPSILON:
+            return lot
+
+        self._seq = max(self._seq, lot.seq)
+        heaps = self._heaps.setdefault(lot.symbol, {method: [] for method in LOT_METHODS})
+        acquired = acquired_timestamp(lot.acquired_at)
+        heapq.heappush(heaps['fifo'], (acquired, lot.seq, lot))
+        heapq.heappush(heaps['lifo'], (-acquired, -lot.seq, lot))
+        heapq.heappush(heaps['hifo'], (-lot.price, lot.seq, lot))
+
+        self.open_quantity[lot.symbol] = self.open_quantity.get(lot.symbol, 0.0) + lot.remaining
+        self.open_cost[lot.symbol] = self.open_cost.get(lot.symbol, 0.0) + lot.remaining * lot.price
+        return lot
+
+    def buy(self, symbol: str, quantity: float, price: float, acquired_at: str,
+            seq: int = None) -> Lot:
+        if quantity <= 0:
+            raise ValueError("Buy quantity must be greater than zero")
+        return self.add(Lot(self._seq + 1 if seq is None else seq, symbol, quantity, price, acquired_at))
+
+    def sell(self, symbol: str, quantity: float, price: float, sold_at: str,
+             method: str = 'fifo') -> List[RealizedGain]:
+        """
+        Consumes open lots of `symbol` in `method` order. Nothing is changed
+        when the sale is invalid. Each returned gain references the lot it
+        came from, whose `remaining` has already been lowered.
+        """
+        if method not in LOT_METHODS:
+            raise ValueError(f"Unknown lot method '{method}'. Expected one of: {', '.join(LOT_METHODS)}")
+        if quantity <= 0:
+            raise ValueError("Sell quantity must be greater than zero")
+        available = self.open_quantity.get(symbol, 0.0)
+        if quantity > available + QUANTITY_EPSILON:
+            raise ValueError(f"Cannot sell {quantity} {symbol}; only {available} held in open lots")
+
+        heap = self._heaps[symbol][method]
+        gains = []
+        to_sell = quantity
+        while to_sell > QUANTITY_EPSILON and heap:
+            lot = heap[0][2]
+            if lot.remaining <= QUANTITY_EPSILON:
+                heapq.heappop(heap)
+                continue
+
+            matched = min(lot.remaining, to_sell)
+            lot.remaining -= matched
+            to_sell -= matched
+            if lot.remaining <= QUANTITY_EPSILON:
+                lot.remaining = 0.0
+                heapq.heappop(heap)
+            gains.append(RealizedGain(lot, matched, matched * price, sold_at))
+
+        self.open_quantity[symbol] -= quantity
+        self.open_cost[symbol] -= sum(gain.cost_basis for gain in gains)
+        if self.open_quantity[symbol] <= QUANTITY_EPSILON:
+            self.open_quantity[symbol] = 0.0
+            self.open_cost[symbol] = 0.0
+        return gains
+
+    def unrealized(self, prices: Dict[str, float]) -> Dict[str, Dict[str, float]]:
+        """Cost basis, market value and unrealized P&L per symbol in one pass over the totals."""
+        result = {}
+        for symbol, quantity in self.open_quantity.items():
+            if quantity <= QUANTITY_EPSILON:
+                continue
+            cost_basis = self.open_cost[symbol]
+            price = prices.get(symbol)
+            market_value = quantity * price if price is not None else None
+            result[symbol] = {
+                "quantity": quantity,
+                "cost_basis": cost_basis,
+                "market_value": market_value,
+                "unrealized_pnl": market_value - cost_basis if market_value is not None else None,
+            }
+        return result
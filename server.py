@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from dotenv import load_dotenv
+from models.asset_handlers import AssetHandlerFactory, AssetType
+from models.price_providers import POLYGON_MIN_INTERVAL_SECONDS, RateLimiter
+from services.portfolio_manager import PortfolioManager
+from utils.cache import TTLCache
+from utils.config import supabase
+
+load_dotenv()
+
+MAX_BODY_BYTES = 64 * 1024
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Validating a stock or crypto symbol makes two Polygon requests: ticker details and previous close.
+POLYGON_VALIDATION_CALLS = 2
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class PortfolioApi:
+    """
+    JSON API over the portfolio services. A single instance is shared by every
+    connection, so the Supabase client, handler sessions and caches stay warm.
+    Blocking calls run on a bounded thread pool. Stock and crypto validations
+    share one limiter for the Polygon key; a validation that would wait longer
+    than `validation_wait` seconds for it is refused instead of tying up a worker.
+    """
+
+    def __init__(self, workers: int = 16, validation_ttl: float = 300, token_ttl: float = 60,
+                 validation_wait: float = 30):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
+        self.portfolio = PortfolioManager()
+        self.validations = TTLCache(validation_ttl)
+        self.users = TTLCache(token_ttl)
+        self.polygon_limiter = RateLimiter(POLYGON_MIN_INTERVAL_SECONDS)
+        self.validation_wait = validation_wait
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    # --- Helpers ---
+
+    def _resolve_user(self, token: str) -> str:
+        response = supabase.auth.get_user(token)
+        if not response or not response.user:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Invalid access token")
+        return response.user.id
+
+    async def authenticate(self, headers) -> str:
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Missing bearer token")
+        try:
+            return await self.run(self.users.get_or_load, token,
+                                  functools.partial(self._resolve_user, token))
+        except ApiError:
+            raise
+        except Exception:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Invalid access token")
+
+    def _validate(self, asset_type: AssetType, symbol: str = None,
+                  group_id: str = None, product_id: str = None):
+        if asset_type == AssetType.POKEMON:
+            if not group_id or not product_id:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "group_id and product_id are required for pokemon")
+            key = (asset_type, f"{group_id}:{product_id}")
+            loader = functools.partial(
+                AssetHandlerFactory.validate_pokemon_asset_inputs, group_id, product_id)
+        else:
+            if not symbol:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "symbol is required")
+            key = (asset_type, symbol.strip().upper())
+            loader = functools.partial(AssetHandlerFactory.validate_asset, asset_type, symbol)
+
+        result = self.validations.get(key)
+        if result is None:
+            if asset_type != AssetType.POKEMON and not self.polygon_limiter.wait(
+                    POLYGON_VALIDATION_CALLS, self.validation_wait):
+                raise ApiError(HTTPStatus.TOO_MANY_REQUESTS, "Too many symbol validations; try again later")
+            result = loader()
+            # Only successful lookups are cached so transient API errors are retried.
+            if result.is_valid:
+                self.validations.set(key, result)
+        return result
+
+    @staticmethod
+    def _parse_asset_type(value) -> AssetType:
+        try:
+            return AssetType(str(value).lower())
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown asset_type '{value}'")
+
+    @staticmethod
+    def _parse_quantity(value, allow_zero: bool) -> float:
+        try:
+            quantity = float(value)
+        except (TypeError, ValueError):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "quantity must be a number")
+        if quantity < 0 or (quantity == 0 and not allow_zero):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "quantity must be greater than zero")
+        return quantity
+
+    @staticmethod
+    def _check(result, action: str):
+        if result is None:
+            raise ApiError(HTTPStatus.BAD_GATEWAY, f"Failed to {action}")
+        return result
+
+    # --- Routes ---
+
+    async def dispatch(self, method: str, target: str, headers, body: bytes):
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if parts == ['health'] and method == 'GET':
+            return HTTPStatus.OK, {"status": "ok"}
+
+        if parts == ['validate'] and method == 'GET':
+            await self.authenticate(headers)
+            result = await self.run(
+                self._validate, self._parse_asset_type(query.get('asset_type')),
+                query.get('symbol'), query.get('group_id'), query.get('product_id'))
+            return HTTPStatus.OK, {
+                "is_valid": result.is_valid,
+                "symbol": result.formatted_symbol,
+                "data": result.data,
+                "error": result.error_message or None,
+            }
+
+        if not parts or parts[0] != 'portfolio' or len(parts) > 2:
+            raise ApiError(HTTPStatus.NOT_FOUND, "Not found")
+
+        user_id = await self.authenticate(headers)
+        payload = self._parse_body(body)
+
+        if len(parts) == 1 and method == 'GET':
+            return await self.list_assets(user_id, query)
+
+        if len(parts) == 1 and method == 'POST':
+            return await self.add_asset(user_id, payload)
+
+        if parts[1:] == ['summary'] and method == 'GET':
+            summary = self._check(
+                await self.run(self.portfolio.view_summary, user_id), "read portfolio summary")
+            return HTTPStatus.OK, summary
+
+        if len(parts) == 1:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "Method not allowed")
+
+        symbol = parts[1].upper()
+        if method == 'PUT':
+            quantity = self._parse_quantity(payload.get('quantity'), allow_zero=True)
+            result = self._check(
+                await self.run(self.portfolio.update_asset, user_id, symbol, quantity), "update asset")
+            if not result.data:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"You don't own any {symbol}")
+            return HTTPStatus.OK, {"symbol": symbol, "quantity": quantity}
+
+        if method == 'DELETE':
+            result = self._check(
+                await self.run(self.portfolio.delete_asset, user_id, symbol), "delete asset")
+            if not result.data:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"You don't own any {symbol}")
+            return HTTPStatus.OK, {"deleted": symbol}
+
+        raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "Method not allowed")
+
+    async def list_assets(self, user_id: str, query):
+        """One keyset page of holdings; pass `next_after` back as `after` for the next one."""
+        try:
+            limit = min(int(query.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            after_id = int(query['after']) if 'after' in query else None
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit and after must be integers")
+        if limit <= 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be positive")
+
+        pages = self.portfolio.iter_portfolio(
+            user_id, page_size=limit, asset_type=query.get('asset_type'), after_id=after_id)
+        assets = await self.run(next, pages, [])
+        next_after = assets[-1]['id'] if len(assets) == limit else None
+        return HTTPStatus.OK, {"assets": assets, "next_after": next_after}
+
+    async def add_asset(self, user_id: str, payload):
+        asset_type = self._parse_asset_type(payload.get('asset_type'))
+        quantity = self._parse_quantity(payload.get('quantity'), allow_zero=False)
+        validation_result = await self.run(
+            self._validate, asset_type, payload.get('symbol'),
+            payload.get('group_id'), payload.get('product_id'))
+        if not validation_result.is_valid:
+            raise ApiError(HTTPStatus.UNPROCESSABLE_ENTITY, validation_result.error_message)
+
+        asset_data = dict(validation_result.data, quantity=quantity)
+        result = self._check(await self.run(self.portfolio.add_asset, user_id, asset_data), "add asset")
+        return HTTPStatus.CREATED, {"assets": result.data}
+
+    @staticmethod
+    def _parse_body(body: bytes):
+        if not body:
+            return {}
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be JSON")
+        if not isinstance(payload, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+        return payload
+
+
+def write_response(writer, status: HTTPStatus, payload, keep_alive: bool):
+    body = json.dumps(payload, default=str).encode()
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+
+
+async def handle_connection(api: PortfolioApi, reader, writer):
+    """Serves HTTP/1.1 requests on one connection, keeping it open between requests."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "Malformed request line"}, False)
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            try:
+                length = int(headers.get('content-length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "Invalid Content-Length"}, False)
+                break
+            if length > MAX_BODY_BYTES:
+                write_response(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Body too large"}, False)
+                break
+            body = await reader.readexactly(length) if length else b''
+
+            try:
+                status, payload = await api.dispatch(method.upper(), target, headers, body)
+            except ApiError as e:
+                status, payload = e.status, {"error": e.message}
+            except Exception as e:
+                print(f"Error handling {method} {target}: {e}")
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"}
+
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int, workers: int):
+    AssetHandlerFactory.initialize(os.getenv('POLYGON_API_KEY'), pool_size=workers)
+    api = PortfolioApi(workers=workers)
+    server = await asyncio.start_server(
+        functools.partial(handle_connection, api), host, port)
+    print(f"Portfolio API listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the portfolio API over HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=16,
+                        help="Threads for blocking Supabase/price API calls, also the HTTP pool size per handler.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,354 @@
+from utils.config import supabase
+from services.portfolio_manager import PortfolioManager, PORTFOLIO_COLUMNS
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+import json
+import os
+import sqlite3
+
+DEFAULT_REPLICA_PATH = os.path.join(
+    os.path.expanduser('~'), '.portfolio_tracker', 'replica.db')
+
+SYNC_PAGE_SIZE = 1000
+
+HOLDING_COLUMNS = ('id', 'user_id', 'asset_type', 'symbol', 'asset_name',
+                   'quantity', 'current_price', 'created_at', 'updated_at')
+
+# Deletions mark for a replica that has seen no deletion yet.
+EPOCH = '1970-01-01T00:00:00'
+
+
+class ReplicaResult:
+    """Mirrors the `.data` attribute of a Supabase response."""
+
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+class LocalReplica:
+    """
+    SQLite copy of a user's `portfoliosv2` rows. Reads are served locally,
+    mutations are applied locally and queued, and `sync` pushes the queue in
+    batches before pulling only rows changed since the last `updated_at` seen
+    and the ids deleted since the last `portfolio_deletions` entry seen.
+    Exposes the same methods as PortfolioManager so the CLI can use either.
+    """
+
+    def __init__(self, path: str = None, manager: PortfolioManager = None):
+        self.path = path or os.getenv('PORTFOLIO_REPLICA_PATH', DEFAULT_REPLICA_PATH)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.manager = manager or PortfolioManager()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS holdings (
+                    local_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id INTEGER UNIQUE,
+                    user_id TEXT NOT NULL,
+                    asset_type TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    asset_name TEXT,
+                    quantity REAL NOT NULL,
+                    current_price REAL,
+                    created_at TEXT,
+                    updated_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS holdings_user_symbol ON holdings (user_id, symbol);
+
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    user_id TEXT PRIMARY KEY,
+                    high_water_mark TEXT,
+                    deletions_mark TEXT,
+                    last_synced_at TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS pending_ops (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    op TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    payload TEXT
+                );
+            """)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sync_state)")}
+            if 'deletions_mark' not in columns:
+                # Replicas created before deletions were tracked resync in full once.
+                self.conn.execute("ALTER TABLE sync_state ADD COLUMN deletions_mark TEXT")
+
+    def _rows(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def _queue(self, user_id: str, op: str, symbol: str, payload: Dict[str, Any] = None):
+        self.conn.execute(
+            "INSERT INTO pending_ops (user_id, op, symbol, payload) VALUES (?, ?, ?, ?)",
+            (user_id, op, symbol, json.dumps(payload) if payload is not None else None))
+
+    def pending_count(self, user_id: str) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM pending_ops WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def high_water_mark(self, user_id: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT high_water_mark FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def deletions_mark(self, user_id: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT deletions_mark FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    # --- PortfolioManager interface, served locally ---
+
+    def add_asset(self, user_id: str, asset_data: Dict[str, Any]):
+        insert_data = PortfolioManager.build_insert_data(user_id, asset_data)
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO holdings (user_id, asset_type, symbol, asset_name, quantity, current_price) "
+                "VALUES (:user_id, :asset_type, :symbol, :asset_name, :quantity, :current_price)",
+                insert_data)
+            self._queue(user_id, 'add', insert_data['symbol'], insert_data)
+        return ReplicaResult([insert_data])
+
+    def view_portfolio(self, user_id: str, columns: Sequence[str] = PORTFOLIO_COLUMNS):
+        return ReplicaResult(self._rows(
+            f"SELECT {_column_list(columns)} FROM holdings WHERE user_id = ? ORDER BY local_id",
+            (user_id,)))
+
+    def view_holding(self, user_id: str, symbol: str,
+                     columns: Sequence[str] = PORTFOLIO_COLUMNS) -> List[Dict[str, Any]]:
+        return self._rows(
+            f"SELECT {_column_list(columns)} FROM holdings WHERE user_id = ? AND symbol = ? ORDER BY local_id",
+            (user_id, symbol))
+
+    def iter_portfolio(self, user_id: str, columns: Sequence[str] = PORTFOLIO_COLUMNS,
+                       page_size: int = 500, asset_type: str = None,
+                       after_id: int = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Same contract as PortfolioManager.iter_portfolio: synced rows are paged
+        by their remote `id`, and `after_id` is a remote id. Rows added locally
+        and not pushed yet have no id, so they come last, paged by insertion order.
+        """
+        select_columns = list(columns) if 'id' in columns else ['id', *columns]
+        filters, params = "user_id = ?", [user_id]
+        if asset_type:
+            filters += " AND asset_type = ?"
+            params.append(asset_type)
+
+        # Remote ids are positive, and `id > ?` also skips the unsynced NULL ids.
+        last_id = after_id or 0
+        while True:
+            page = self._rows(
+                f"SELECT {_column_list(select_columns)} FROM holdings "
+                f"WHERE {filters} AND id > ? ORDER BY id LIMIT ?",
+                tuple(params) + (last_id, page_size))
+            if page:
+                last_id = page[-1]['id']
+                yield page
+            if len(page) < page_size:
+                break
+
+        last_local_id = 0
+        while True:
+            page = self._rows(
+                f"SELECT local_id, {_column_list(select_columns)} FROM holdings "
+                f"WHERE {filters} AND id IS NULL AND local_id > ? ORDER BY local_id LIMIT ?",
+                tuple(params) + (last_local_id, page_size))
+            if page:
+                last_local_id = page[-1]['local_id']
+                yield [_without_local_id(row) for row in page]
+            if len(page) < page_size:
+                return
+
+    def view_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._rows(
+            "SELECT asset_type, SUM(quantity * current_price) AS value FROM holdings "
+            "WHERE user_id = ? GROUP BY asset_type", (user_id,))
+        if not rows:
+            return None
+
+        value_by_type = {row['asset_type']: row['value'] or 0.0 for row in rows}
+        return {"total_value": sum(value_by_type.values()), "value_by_type": value_by_type}
+
+    def update_asset(self, user_id: str, symbol: str, quantity: float):
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE holdings SET quantity = ? WHERE user_id = ? AND symbol = ?",
+                (quantity, user_id, symbol))
+            self._queue(user_id, 'update', symbol, {"quantity": quantity})
+        return ReplicaResult([{"symbol": symbol, "quantity": quantity}] * cursor.rowcount)
+
+    def delete_asset(self, user_id: str, symbol: str):
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM holdings WHERE user_id = ? AND symbol = ?", (user_id, symbol))
+            self._queue(user_id, 'delete', symbol)
+        return ReplicaResult([{"symbol": symbol}] * cursor.rowcount)
+
+    # --- Synchronisation ---
+
+    def push(self, user_id: str) -> bool:
+        """
+        Sends queued mutations in order. Consecutive adds go out as one insert
+        and consecutive deletes as one delete; repeated updates of a symbol
+        collapse to the last quantity. Stops at the first failure and keeps the
+        rest queued. Returns True once the queue is empty.
+        """
+        ops = self._rows(
+            "SELECT seq, op, symbol, payload FROM pending_ops WHERE user_id = ? ORDER BY seq",
+            (user_id,))
+        if not ops:
+            return True
+
+        batches = []
+        for op in ops:
+            if batches and batches[-1][0] == op['op']:
+                batches[-1][1].append(op)
+            else:
+                batches.append((op['op'], [op]))
+
+        for op, batch in batches:
+            if op == 'add':
+                result = self.manager.add_assets(
+                    user_id, [_asset_data(json.loads(item['payload'])) for item in batch])
+            elif op == 'delete':
+                result = self.manager.delete_assets(user_id, sorted({item['symbol'] for item in batch}))
+            else:
+                latest = {item['symbol']: json.loads(item['payload'])['quantity'] for item in batch}
+                result = True
+                for symbol, quantity in latest.items():
+                    if self.manager.update_asset(user_id, symbol, quantity) is None:
+                        result = None
+                        break
+
+            if result is None:
+                print(f"Could not push pending changes; {self.pending_count(user_id)} kept for the next sync.")
+                return False
+
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM pending_ops WHERE user_id = ? AND seq <= ?",
+                    (user_id, batch[-1]['seq']))
+
+        return True
+
+    def _fetch_changed_rows(self, user_id: str, high_water_mark: Optional[str]) -> List[Dict[str, Any]]:
+        rows = []
+        while True:
+            query = supabase.table('portfoliosv2')\
+                .select(*HOLDING_COLUMNS)\
+                .eq("user_id", user_id)
+            if high_water_mark:
+                query = query.gte("updated_at", high_water_mark)
+            page = query.order("updated_at").order("id")\
+                .range(len(rows), len(rows) + SYNC_PAGE_SIZE - 1)\
+                .execute().data or []
+            rows.extend(page)
+            if len(page) < SYNC_PAGE_SIZE:
+                return rows
+
+    def _fetch_deletions(self, user_id: str, deletions_mark: str) -> List[Dict[str, Any]]:
+        rows = []
+        while True:
+            page = supabase.table('portfolio_deletions')\
+                .select("id", "deleted_at")\
+                .eq("user_id", user_id)\
+                .gte("deleted_at", deletions_mark)\
+                .order("deleted_at").order("id")\
+                .range(len(rows), len(rows) + SYNC_PAGE_SIZE - 1)\
+                .execute().data or []
+            rows.extend(page)
+            if len(page) < SYNC_PAGE_SIZE:
+                return rows
+
+    def _latest_deletion(self, user_id: str) -> str:
+        rows = supabase.table('portfolio_deletions')\
+            .select("deleted_at")\
+            .eq("user_id", user_id)\
+            .order("deleted_at", desc=True)\
+            .limit(1)\
+            .execute().data
+        return rows[0]['deleted_at'] if rows else EPOCH
+
+    def pull(self, user_id: str) -> int:
+        """
+        Applies remote changes. The first pull (or one from a replica that has
+        never tracked deletions) loads every row; later pulls fetch only rows
+        changed and ids deleted since the marks, so they cost O(changes).
+        """
+        high_water_mark = self.high_water_mark(user_id)
+        deletions_mark = self.deletions_mark(user_id)
+        full = high_water_mark is None or deletions_mark is None
+        if full:
+            # Read before the rows, so a deletion that races the load is still seen next time.
+            high_water_mark, deletions, deletions_mark = None, [], self._latest_deletion(user_id)
+            changed_rows = self._fetch_changed_rows(user_id, None)
+        else:
+            changed_rows = self._fetch_changed_rows(user_id, high_water_mark)
+            deletions = self._fetch_deletions(user_id, deletions_mark)
+
+        with self.conn:
+            if full:
+                self.conn.execute("DELETE FROM holdings WHERE user_id = ?", (user_id,))
+            else:
+                # Pushed local adds come back from the server with their ids.
+                self.conn.execute(
+                    "DELETE FROM holdings WHERE user_id = ? AND id IS NULL", (user_id,))
+
+            self.conn.executemany(
+                f"INSERT INTO holdings ({', '.join(HOLDING_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in HOLDING_COLUMNS)}) "
+                "ON CONFLICT (id) DO UPDATE SET "
+                + ", ".join(f"{column} = excluded.{column}" for column in HOLDING_COLUMNS[1:]),
+                [tuple(row.get(column) for column in HOLDING_COLUMNS) for row in changed_rows])
+            # Ids are never reused, so a tombstone always wins over a changed row.
+            self.conn.executemany(
+                "DELETE FROM holdings WHERE id = ?", [(row['id'],) for row in deletions])
+
+            new_high_water_mark = max(
+                (row['updated_at'] for row in changed_rows if row.get('updated_at')),
+                default=high_water_mark)
+            new_deletions_mark = max(
+                (row['deleted_at'] for row in deletions), default=deletions_mark)
+            self.conn.execute(
+                "INSERT INTO sync_state (user_id, high_water_mark, deletions_mark, last_synced_at) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET high_water_mark = excluded.high_water_mark, "
+                "deletions_mark = excluded.deletions_mark, last_synced_at = excluded.last_synced_at",
+                (user_id, new_high_water_mark, new_deletions_mark, datetime.now(timezone.utc).isoformat()))
+
+        return len(changed_rows) + len(deletions)
+
+    def sync(self, user_id: str) -> bool:
+        """Pushes queued changes, then pulls remote changes. Returns False when offline."""
+        try:
+            if not self.push(user_id):
+                return False
+            self.pull(user_id)
+            return True
+        except Exception as e:
+            print(f"Sync failed, using local data: {str(e)}")
+            return False
+
+
+def _asset_data(insert_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns a queued insert row back into the shape PortfolioManager.add_assets expects."""
+    return dict(insert_data, name=insert_data['asset_name'])
+
+
+def _without_local_id(row: Dict[str, Any]) -> Dict[str, Any]:
+    row.pop('local_id', None)
+    return row
+
+
+def _column_list(columns: Sequence[str]) -> str:
+    unknown = set(columns) - set(HOLDING_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown holding columns: {', '.join(sorted(unknown))}")
+    return ', '.join(columns)
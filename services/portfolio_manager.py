@@ -1,50 +1,106 @@
 from utils.config import supabase
-from typing import Dict, Any
+from services.portfolio_summary import PortfolioSummaryService
+from typing import Dict, Any, Iterator, List, Sequence
+
+PORTFOLIO_COLUMNS = ("id", "asset_type", "symbol", "asset_name", "quantity", "current_price")
 
 
 class PortfolioManager:
+    def __init__(self):
+        self.summaries = PortfolioSummaryService()
+
+    @staticmethod
+    def build_insert_data(user_id: str, asset_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "user_id": user_id,
+            "asset_type": str(asset_data.get("asset_type", "")),
+            "symbol": asset_data.get("symbol", ""),
+            "asset_name": asset_data.get("name", ""),
+            "quantity": float(asset_data.get("quantity", 0)),
+            "current_price": float(asset_data.get("current_price")) if asset_data.get("current_price") else None,
+        }
+
     def add_asset(self, user_id: str, asset_data: Dict[str, Any]):
+        return self.add_assets(user_id, [asset_data])
+
+    def add_assets(self, user_id: str, assets_data: List[Dict[str, Any]]):
         try:
-            insert_data = {
-                "user_id": user_id,
-                "asset_type": str(asset_data.get("asset_type", "")),
-                "symbol": asset_data.get("symbol", ""),
-                "asset_name": asset_data.get("name", ""),
-                "quantity": float(asset_data.get("quantity", 0)),
-                "current_price": float(asset_data.get("current_price")) if asset_data.get("current_price") else None,
-            }
+            insert_data = [self.build_insert_data(user_id, asset_data) for asset_data in assets_data]
             return supabase.table('portfoliosv2').insert(insert_data).execute()
         except Exception as e:
             print(f"Error adding asset: {str(e)}")
             return None
 
-    def view_portfolio(self, user_id: str):
+    def view_portfolio(self, user_id: str, columns: Sequence[str] = PORTFOLIO_COLUMNS):
         try:
             return supabase.table('portfoliosv2')\
-                .select("*")\
+                .select(*columns)\
                 .eq("user_id", user_id)\
                 .execute()
         except Exception as e:
             print(f"Error viewing portfolio: {str(e)}")
             return None
-        
+
+    def view_holding(self, user_id: str, symbol: str,
+                     columns: Sequence[str] = PORTFOLIO_COLUMNS) -> List[Dict[str, Any]]:
+        """The user's rows for one symbol. Errors are raised, so a failed read is never taken for 'not held'."""
+        return supabase.table('portfoliosv2')\
+            .select(*columns)\
+            .eq("user_id", user_id)\
+            .eq("symbol", symbol)\
+            .execute().data or []
+
+    def iter_portfolio(self, user_id: str, columns: Sequence[str] = PORTFOLIO_COLUMNS,
+                       page_size: int = 500, asset_type: str = None,
+                       after_id: int = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields the user's holdings page by page, ordered by id. Each page
+        continues after the last id seen (keyset pagination), so deep pages
+        cost the same as the first one. Errors are raised rather than ending
+        the stream early, so callers never mistake a partial listing for a
+        complete one.
+        """
+        select_columns = list(columns) if 'id' in columns else ['id', *columns]
+        last_id = after_id
+        while True:
+            query = supabase.table('portfoliosv2')\
+                .select(*select_columns)\
+                .eq("user_id", user_id)
+            if asset_type:
+                query = query.eq("asset_type", asset_type)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = query.order("id").limit(page_size).execute().data or []
+
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            last_id = page[-1]['id']
+
+    def view_summary(self, user_id: str):
+        return self.summaries.get_summary(user_id)
+
     def update_asset(self, user_id: str, symbol: str, quantity: float):
         try:
             return supabase.table('portfoliosv2')\
-                .update({"quantity":quantity})\
+                .update({"quantity": quantity})\
                 .eq("user_id", user_id)\
                 .eq("symbol", symbol)\
                 .execute()
         except Exception as e:
             print(f"Error viewing portfolio: {str(e)}")
             return None
-        
+
     def delete_asset(self, user_id: str, symbol: str):
+        return self.delete_assets(user_id, [symbol])
+
+    def delete_assets(self, user_id: str, symbols: List[str]):
         try:
             return supabase.table('portfoliosv2')\
                 .delete()\
                 .eq("user_id", user_id)\
-                .eq("symbol", symbol)\
+                .in_("symbol", symbols)\
                 .execute()
         except Exception as e:
             print(f"Error viewing portfolio: {str(e)}")
@@ -0,0 +1,40 @@
+from utils.config import supabase
+from typing import Dict, Any, Optional
+
+
+class PortfolioSummaryService:
+    """
+    Reads the per-user `portfolio_summaries` rows. Triggers on `portfoliosv2`
+    keep them up to date in the same transaction as every holding change.
+    """
+
+    TABLE = 'portfolio_summaries'
+    REFRESH_RPC = 'refresh_portfolio_summary'
+
+    def _read_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        response = supabase.table(self.TABLE)\
+            .select("total_value", "value_by_type", "updated_at")\
+            .eq("user_id", user_id)\
+            .limit(1)\
+            .execute()
+        return response.data[0] if response.data else None
+
+    def get_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user's summary row, built from their holdings on first read if it is missing."""
+        try:
+            summary = self._read_summary(user_id)
+            if summary is None:
+                self.rebuild(user_id)
+                summary = self._read_summary(user_id)
+            return summary
+        except Exception as e:
+            print(f"Error reading portfolio summary: {str(e)}")
+            return None
+
+    def rebuild(self, user_id: str):
+        """Recomputes a user's summary from scratch in the database."""
+        try:
+            return supabase.rpc(self.REFRESH_RPC, {"p_user_id": user_id}).execute()
+        except Exception as e:
+            print(f"Error rebuilding portfolio summary: {str(e)}")
+            return None
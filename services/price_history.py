@@ -0,0 +1,32 @@
+from utils.config import supabase
+from typing import Dict, Any, List
+
+
+class PriceHistoryStore:
+    """Buffers daily prices and writes them to `price_history` in bulk upserts."""
+
+    TABLE = 'price_history'
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self.buffer: List[Dict[str, Any]] = []
+        self.written = 0
+
+    def add(self, symbol: str, asset_type: str, price_date: str, price: float):
+        self.buffer.append({
+            "symbol": symbol,
+            "asset_type": asset_type,
+            "price_date": price_date,
+            "price": price,
+        })
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        supabase.table(self.TABLE)\
+            .upsert(self.buffer, on_conflict="symbol,price_date")\
+            .execute()
+        self.written += len(self.buffer)
+        self.buffer = []
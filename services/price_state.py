@@ -0,0 +1,91 @@
+import json
+import os
+import time
+from typing import Dict, Any, Optional
+
+DEFAULT_STATE_FILE = '.price_state.json'
+
+
+class PriceStateStore:
+    """
+    Local JSON file holding what the update job last wrote: the holdings
+    snapshot it priced against, the last price written per symbol, when each
+    symbol was last refreshed and what the last run had to defer.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv('PRICE_STATE_FILE', DEFAULT_STATE_FILE)
+        self.state = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable price state file {self.path}: {e}")
+            return {}
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def holdings(self) -> Dict[str, Any]:
+        return self.state.get('holdings', {})
+
+    def set_holdings(self, holdings: Dict[str, Any]):
+        self.state['holdings'] = holdings
+        self.state['holdings_fetched_at'] = time.time()
+
+    def holdings_age(self) -> Optional[float]:
+        fetched_at = self.state.get('holdings_fetched_at')
+        return time.time() - fetched_at if fetched_at else None
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        return self.state.get('last_prices', {}).get(symbol)
+
+    def record_price(self, symbol: str, price: Optional[float]):
+        self.state.setdefault('last_prices', {})[symbol] = price
+
+    def last_refreshed(self, symbol: str) -> Optional[float]:
+        return self.state.get('last_refreshed', {}).get(symbol)
+
+    def mark_refreshed(self, symbol: str, refreshed_at: float = None):
+        self.state.setdefault('last_refreshed', {})[symbol] = refreshed_at or time.time()
+
+    def average_cost(self, asset_type: str) -> Optional[float]:
+        return self.state.get('average_cost_seconds', {}).get(asset_type)
+
+    def record_cost(self, asset_type: str, seconds: float, weight: float = 0.2):
+        """Keeps an exponential moving average of how long one asset of a type takes."""
+        costs = self.state.setdefault('average_cost_seconds', {})
+        previous = costs.get(asset_type)
+        costs[asset_type] = seconds if previous is None else \
+            previous + weight * (seconds - previous)
+
+    @property
+    def deferred(self):
+        return self.state.get('deferred', [])
+
+    def set_deferred(self, deferred):
+        self.state['deferred'] = deferred
+
+
+def price_moved(last_price: Optional[float], new_price: float,
+                abs_epsilon: float = 0.0, rel_epsilon: float = 0.0) -> bool:
+    """
+    True when a new price is worth writing: it has never been written, or it
+    moved by more than `abs_epsilon` or by more than `rel_epsilon` of the last
+    price. An epsilon of 0 is disabled; with both disabled any change counts.
+    """
+    if not last_price:
+        return True
+    move = abs(new_price - last_price)
+    if not abs_epsilon and not rel_epsilon:
+        return move > 0
+    return (bool(abs_epsilon) and move > abs_epsilon) or \
+        (bool(rel_epsilon) and move > rel_epsilon * abs(last_price))
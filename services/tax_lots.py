@@ -0,0 +1,176 @@
+from utils.config import supabase
+from services.portfolio_manager import PortfolioManager
+from models.tax_lots import QUANTITY_EPSILON, Lot, LotBook, RealizedGain, acquired_timestamp
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+# Marks a user whose open lots are loaded for every symbol.
+ALL_SYMBOLS = None
+
+
+class TaxLotService:
+    """
+    Records buy/sell transactions in `transactions`, keeps every lot with its
+    remaining quantity in `tax_lots`, and keeps the holding quantity in
+    `portfoliosv2` in step through a PortfolioManager (or any object with the
+    same interface, such as LocalReplica).
+
+    A user's open lots are loaded into a LotBook the first time a symbol is
+    traded and then updated in place, so a sale pops only that symbol's lots
+    and writes back only the lots it consumed. The cache assumes this
+    service is the only writer of the user's lots, as in a CLI session.
+    Each ledger entry is written together with its lots by one SQL function.
+    """
+
+    LOTS_TABLE = 'tax_lots'
+    PURCHASE_RPC = 'record_lot_purchase'
+    SALE_RPC = 'record_lot_sale'
+    REALIZED_RPC = 'realized_gains_by_symbol'
+
+    def __init__(self, portfolio=None, page_size: int = 1000):
+        self.portfolio = portfolio or PortfolioManager()
+        self.page_size = page_size
+        self._books: Dict[str, LotBook] = {}
+        self._loaded: Dict[str, Set[Optional[str]]] = {}
+
+    def _iter_open_lots(self, user_id: str, symbol: str = None) -> Iterator[Dict[str, Any]]:
+        last_id = None
+        while True:
+            query = supabase.table(self.LOTS_TABLE)\
+                .select("id", "symbol", "quantity", "remaining", "price", "acquired_at")\
+                .eq("user_id", user_id)\
+                .gt("remaining", 0)
+            if symbol:
+                query = query.eq("symbol", symbol)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = query.order("id").limit(self.page_size).execute().data or []
+            yield from page
+            if len(page) < self.page_size:
+                return
+            last_id = page[-1]['id']
+
+    def _book(self, user_id: str, symbol: str = ALL_SYMBOLS) -> LotBook:
+        """The user's cached LotBook, with the open lots of `symbol` (or all symbols) loaded."""
+        book = self._books.setdefault(user_id, LotBook())
+        loaded = self._loaded.setdefault(user_id, set())
+        if ALL_SYMBOLS in loaded or symbol in loaded:
+            return book
+
+        for row in self._iter_open_lots(user_id, symbol):
+            if row['symbol'] in loaded:
+                continue
+            book.add(Lot(row['id'], row['symbol'], float(row['quantity']), float(row['price']),
+                         row['acquired_at'], remaining=float(row['remaining'])))
+        loaded.add(symbol)
+        return book
+
+    def _forget(self, user_id: str):
+        """Drops the cached book after a failed write so it is reloaded from storage."""
+        self._books.pop(user_id, None)
+        self._loaded.pop(user_id, None)
+
+    def _held_quantity(self, user_id: str, symbol: str) -> Optional[float]:
+        """The quantity held of `symbol`, or None when it is not held. Read errors raise."""
+        rows = self.portfolio.view_holding(user_id, symbol, ("quantity",))
+        return sum(float(row['quantity']) for row in rows) if rows else None
+
+    def _open_lot(self, user_id: str, asset_type: str, symbol: str, quantity: float,
+                  price: float, side: str = 'buy', acquired_at: str = None) -> Lot:
+        if quantity <= 0:
+            raise ValueError("Buy quantity must be greater than zero")
+
+        acquired_at = acquired_at or datetime.now(timezone.utc).isoformat()
+        row = supabase.rpc(self.PURCHASE_RPC, {
+            "p_user_id": user_id,
+            "p_asset_type": str(asset_type),
+            "p_symbol": symbol,
+            "p_side": side,
+            "p_quantity": quantity,
+            "p_price": price,
+            "p_acquired_at": acquired_at,
+        }).execute().data[0]
+
+        lot = Lot(row['id'], symbol, quantity, price, acquired_at)
+        loaded = self._loaded.get(user_id, set())
+        if ALL_SYMBOLS in loaded or symbol in loaded:
+            self._books[user_id].add(lot)
+        return lot
+
+    def record_buy(self, user_id: str, asset_data: Dict[str, Any], quantity: float, price: float):
+        """Adds a lot and raises the holding, creating it from `asset_data` if needed."""
+        symbol = asset_data['symbol']
+        self._open_lot(user_id, asset_data['asset_type'], symbol, quantity, price)
+
+        held = self._held_quantity(user_id, symbol)
+        if held is None:
+            return self.portfolio.add_asset(user_id, dict(asset_data, quantity=quantity))
+        return self.portfolio.update_asset(user_id, symbol, held + quantity)
+
+    def record_opening_lot(self, user_id: str, asset_type: str, symbol: str,
+                           quantity: float, price: float, acquired_at: str) -> Lot:
+        """
+        Adds a lot for units already in the holding, bought on `acquired_at`
+        (an ISO date) before the ledger was used. It is recorded in the ledger
+        as an 'open' transaction rather than a buy. The holding quantity is
+        left unchanged, and lots can never cover more than the holding.
+        """
+        if acquired_timestamp(acquired_at) > datetime.now(timezone.utc).timestamp():
+            raise ValueError("Acquisition date cannot be in the future")
+        held = self._held_quantity(user_id, symbol) or 0.0
+        untracked = held - self._book(user_id, symbol).open_quantity.get(symbol, 0.0)
+        if quantity > untracked + QUANTITY_EPSILON:
+            raise ValueError(f"Only {max(untracked, 0.0)} {symbol} are not covered by lots yet")
+        return self._open_lot(user_id, asset_type, symbol, quantity, price, 'open', acquired_at)
+
+    def record_sell(self, user_id: str, asset_type: str, symbol: str, quantity: float,
+                    price: float, method: str = 'fifo') -> List[RealizedGain]:
+        """Matches the sale against open lots and lowers the holding. Returns the realized gains."""
+        book = self._book(user_id, symbol)
+        sold_at = datetime.now(timezone.utc).isoformat()
+        gains = book.sell(symbol, quantity, price, sold_at, method)
+
+        try:
+            # Stores the sale and the lots it consumed in one transaction, so a
+            # realized gain is never recorded while its lots stay open.
+            supabase.rpc(self.SALE_RPC, {
+                "p_user_id": user_id,
+                "p_asset_type": str(asset_type),
+                "p_symbol": symbol,
+                "p_quantity": quantity,
+                "p_price": price,
+                "p_lot_method": method,
+                "p_realized_gain": sum(gain.gain for gain in gains),
+                "p_sold_at": sold_at,
+                "p_lots": [{"id": gain.lot.seq, "remaining": gain.lot.remaining} for gain in gains],
+            }).execute()
+        except Exception:
+            self._forget(user_id)
+            raise
+
+        held = self._held_quantity(user_id, symbol) or 0.0
+        remaining = max(held - quantity, 0.0)
+        if remaining <= QUANTITY_EPSILON:
+            self.portfolio.delete_asset(user_id, symbol)
+        else:
+            self.portfolio.update_asset(user_id, symbol, remaining)
+        return gains
+
+    def profit_and_loss(self, user_id: str) -> Dict[str, Dict[str, float]]:
+        """Per-symbol cost basis, unrealized P&L at stored prices, and realized P&L."""
+        book = self._book(user_id)
+        prices = {}
+        for page in self.portfolio.iter_portfolio(user_id, ("symbol", "current_price")):
+            for row in page:
+                if row.get('current_price') is not None:
+                    prices[row['symbol']] = float(row['current_price'])
+
+        report = book.unrealized(prices)
+        realized_rows = supabase.rpc(self.REALIZED_RPC, {"p_user_id": user_id}).execute().data or []
+        for row in realized_rows:
+            report.setdefault(row['symbol'], {
+                "quantity": 0.0, "cost_basis": 0.0, "market_value": 0.0, "unrealized_pnl": 0.0,
+            })["realized_pnl"] = float(row['realized_gain'] or 0)
+        for values in report.values():
+            values.setdefault("realized_pnl", 0.0)
+        return report
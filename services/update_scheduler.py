@@ -0,0 +1,85 @@
+import re
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from models.asset_handlers import AssetType
+
+# Used until the state file has measured timings for an asset type. Polygon's
+# free tier allows 5 requests per minute; TCGcsv has no rate limit. Measured
+# timings include provider throttling, so faster fallback sources lower them.
+DEFAULT_COST_SECONDS = {
+    AssetType.STOCK.value: 13.0,
+    AssetType.CRYPTO.value: 13.0,
+    AssetType.POKEMON.value: 2.0,
+}
+
+# Staleness stops adding priority after a week, so a long-deferred penny
+# position cannot outrank a large one forever.
+MAX_STALENESS_DAYS = 7.0
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)([hms]?)')
+
+
+def parse_duration(value: str) -> float:
+    """Parses durations like '45m', '1h30m', '90s' or '600' into seconds."""
+    text = value.strip().lower()
+    if not text or not re.fullmatch(r'(\d+(?:\.\d+)?[hms]?)+', text):
+        raise ValueError(f"Invalid duration '{value}'. Use e.g. 45m, 1h30m or 90s.")
+
+    multipliers = {'h': 3600, 'm': 60, 's': 1, '': 1}
+    return sum(float(amount) * multipliers[unit]
+               for amount, unit in _DURATION_PART.findall(text))
+
+
+class ScheduledAsset:
+    def __init__(self, symbol: str, asset_type: str, value: float,
+                 staleness_days: float, cost_seconds: float):
+        self.symbol = symbol
+        self.asset_type = asset_type
+        self.value = value
+        self.staleness_days = staleness_days
+        self.cost_seconds = cost_seconds
+        self.priority = (value + 1.0) * (1.0 + staleness_days)
+
+
+def rank_assets(holdings: Dict[str, Any], state, now: float = None) -> List[ScheduledAsset]:
+    """
+    Orders unique assets by total held value (aggregated quantity times last
+    price) scaled by how many days ago they were last refreshed.
+    """
+    now = now or time.time()
+    ranked = []
+    for symbol, holding in holdings.items():
+        asset_type = holding['asset_type']
+        if asset_type not in DEFAULT_COST_SECONDS:
+            continue
+
+        value = sum(stored_value for _, stored_value in holding['users'].values())
+        last_refreshed = state.last_refreshed(symbol)
+        staleness_days = MAX_STALENESS_DAYS if last_refreshed is None else \
+            min((now - last_refreshed) / 86400, MAX_STALENESS_DAYS)
+        cost_seconds = state.average_cost(asset_type) or DEFAULT_COST_SECONDS[asset_type]
+        ranked.append(ScheduledAsset(symbol, asset_type, value, staleness_days, cost_seconds))
+
+    ranked.sort(key=lambda asset: asset.priority, reverse=True)
+    return ranked
+
+
+def plan_updates(ranked: List[ScheduledAsset],
+                 budget_seconds: Optional[float]) -> Tuple[List[ScheduledAsset], List[ScheduledAsset]]:
+    """
+    Greedily fits the highest-priority assets into the time budget. Assets that
+    do not fit are deferred, but cheaper ones further down may still be scheduled.
+    """
+    if budget_seconds is None:
+        return list(ranked), []
+
+    scheduled, deferred = [], []
+    remaining = budget_seconds
+    for asset in ranked:
+        if asset.cost_seconds <= remaining:
+            scheduled.append(asset)
+            remaining -= asset.cost_seconds
+        else:
+            deferred.append(asset)
+    return scheduled, deferred
@@ -0,0 +1,82 @@
+import json
+import unittest
+
+from utils.json_stream import iter_json_array_items
+
+
+def chunked(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+class IterJsonArrayItemsTest(unittest.TestCase):
+    def assertItemsAtEveryChunkSize(self, document, key, expected):
+        data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        for size in range(1, len(data) + 1):
+            with self.subTest(chunk_size=size):
+                self.assertEqual(list(iter_json_array_items(chunked(data, size), key)), expected)
+
+    def test_yields_items_of_the_requested_array(self):
+        results = [{"productId": 1, "marketPrice": 2.5}, {"productId": 2, "marketPrice": None}]
+        self.assertItemsAtEveryChunkSize(
+            {"success": True, "errors": [], "results": results, "totalItems": 2}, 'results', results)
+
+    def test_numbers_split_across_chunks_are_not_cut_short(self):
+        self.assertItemsAtEveryChunkSize(
+            {"results": [12345, -0.125, 6.02e23, 7]}, 'results', [12345, -0.125, 6.02e23, 7])
+
+    def test_strings_with_escapes_and_brackets_split_across_chunks(self):
+        items = ['a "quoted" ] value', 'back\\slash, {brace}', '\n\t']
+        self.assertItemsAtEveryChunkSize({"results": items}, 'results', items)
+
+    def test_multibyte_utf8_split_across_chunks(self):
+        items = [{"name": "Pokémon Évolutions"}, {"name": "ポケモン 😀"}]
+        self.assertItemsAtEveryChunkSize({"results": items}, 'results', items)
+
+    def test_skips_nested_values_of_other_fields(self):
+        document = {"meta": {"results": ["not", "this"], "n": [1, [2]]}, "results": [{"a": [1, {"b": 2}]}]}
+        self.assertItemsAtEveryChunkSize(document, 'results', [{"a": [1, {"b": 2}]}])
+
+    def test_accepts_text_chunks_and_whitespace(self):
+        chunks = ['  {\n  "results" : [ 1 ,', ' 2\n, 3 ]  ,"x":  null }  ']
+        self.assertEqual(list(iter_json_array_items(chunks, 'results')), [1, 2, 3])
+
+    def test_empty_array_yields_nothing(self):
+        self.assertItemsAtEveryChunkSize({"results": [], "other": 1}, 'results', [])
+
+    def test_missing_key_and_empty_object_yield_nothing(self):
+        self.assertItemsAtEveryChunkSize({"errors": ["none"], "success": True}, 'results', [])
+        self.assertEqual(list(iter_json_array_items([b'{}'], 'results')), [])
+
+    def test_stops_reading_when_the_caller_stops(self):
+        data = json.dumps({"results": list(range(1000))}).encode()
+        consumed = []
+
+        def chunks():
+            for chunk in chunked(data, 16):
+                consumed.append(chunk)
+                yield chunk
+
+        items = iter_json_array_items(chunks(), 'results')
+        self.assertEqual([next(items) for _ in range(3)], [0, 1, 2])
+        self.assertLess(len(consumed), 3)
+
+    def test_truncated_input_raises(self):
+        data = json.dumps({"results": [{"productId": 1}, {"productId": 22}], "x": 1}).encode()
+        # Anything after the array is never read, so only cuts before its end must fail.
+        for end in range(data.index(b']')):
+            with self.subTest(end=end):
+                with self.assertRaises(ValueError):
+                    for _ in iter_json_array_items(chunked(data[:end], 4), 'results'):
+                        pass
+
+    def test_rejects_non_object_documents(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array_items([b'[1, 2]'], 'results'))
+        with self.assertRaises(ValueError):
+            list(iter_json_array_items([b''], 'results'))
+        with self.assertRaises(ValueError):
+            list(iter_json_array_items([b'{"results": 5}'], 'results'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import time
+import unittest
+
+try:
+    import requests
+    from models.asset_handlers import AssetHandlerFactory, AssetType, PolygonStockHandler
+    from models.price_providers import (HandlerPriceProvider, PriceProvider, PriceProviderRegistry,
+                                        ProviderStats, RateLimiter)
+except ImportError as e:
+    raise unittest.SkipTest(f"price providers need their dependencies installed: {e}")
+
+
+class FakeProvider(PriceProvider):
+    """Prices the symbols in `prices`, or raises `error` on every call."""
+
+    def __init__(self, name, prices=None, error=None, expected_latency=1.0):
+        super().__init__((AssetType.STOCK,))
+        self.name = name
+        self.prices = prices or {}
+        self.error = error
+        self.expected_latency = expected_latency
+        self.calls = []
+
+    def get_prices(self, asset_type, symbols):
+        self.calls.append(list(symbols))
+        if self.error:
+            raise self.error
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+
+def registry_of(*providers):
+    registry = PriceProviderRegistry()
+    for provider in providers:
+        registry.register(provider)
+    return registry
+
+
+class RegistryFallbackTest(unittest.TestCase):
+    def test_unpriced_symbols_fall_through_to_the_next_provider(self):
+        fast = FakeProvider("fast", {"AAPL": 1.0}, expected_latency=0.1)
+        slow = FakeProvider("slow", {"AAPL": 2.0, "MSFT": 3.0}, expected_latency=1.0)
+        registry = registry_of(slow, fast)
+
+        prices, sources = registry.fetch_prices(AssetType.STOCK, ["AAPL", "MSFT", "NOPE"])
+
+        self.assertEqual(prices, {"AAPL": 1.0, "MSFT": 3.0})
+        self.assertEqual(sources, {"AAPL": "fast", "MSFT": "slow"})
+        self.assertEqual(slow.calls, [["MSFT", "NOPE"]])
+
+    def test_failing_provider_hands_the_whole_batch_on(self):
+        broken = FakeProvider("broken", error=Exception("429 Too Many Requests"), expected_latency=0.1)
+        backup = FakeProvider("backup", {"AAPL": 2.0}, expected_latency=1.0)
+        registry = registry_of(broken, backup)
+
+        prices, sources = registry.fetch_prices(AssetType.STOCK, ["AAPL"])
+
+        self.assertEqual(prices, {"AAPL": 2.0})
+        self.assertEqual(sources, {"AAPL": "backup"})
+
+    def test_error_counts_against_the_provider_but_an_empty_answer_does_not(self):
+        raising = FakeProvider("raising", error=Exception("timeout"))
+        empty = FakeProvider("empty")
+        registry = registry_of(raising, empty)
+
+        registry.fetch_prices(AssetType.STOCK, ["AAPL", "MSFT"])
+
+        self.assertEqual(registry.stats["raising"].error_rate, 1.0)
+        self.assertEqual(registry.stats["empty"].error_rate, 0.0)
+        self.assertEqual(registry.stats["empty"].unknown_symbols, 2)
+        self.assertIsNone(registry.stats["empty"].average_latency)
+
+    def test_provider_cools_down_once_its_error_rate_passes_the_limit(self):
+        broken = FakeProvider("broken", error=Exception("503"), expected_latency=0.1)
+        backup = FakeProvider("backup", expected_latency=1.0)
+        registry = registry_of(broken, backup)
+
+        for _ in range(3):
+            self.assertEqual(registry.providers_for(AssetType.STOCK)[0], broken)
+            registry.fetch_prices(AssetType.STOCK, ["AAPL"])
+
+        self.assertFalse(registry.stats["broken"].healthy)
+        self.assertEqual(registry.providers_for(AssetType.STOCK), [backup, broken])
+
+    def test_providers_are_ordered_by_measured_latency_over_the_guess(self):
+        guessed_fast = FakeProvider("guessed-fast", expected_latency=0.1)
+        guessed_slow = FakeProvider("guessed-slow", expected_latency=5.0)
+        registry = registry_of(guessed_fast, guessed_slow)
+        self.assertEqual(registry.providers_for(AssetType.STOCK), [guessed_fast, guessed_slow])
+
+        registry.stats["guessed-fast"].record_success(10.0, returned=2, requested=2)
+        registry.stats["guessed-slow"].record_success(1.0, returned=10, requested=10)
+
+        self.assertEqual(registry.providers_for(AssetType.STOCK), [guessed_slow, guessed_fast])
+
+
+class RateLimitedResponse:
+    status_code = 429
+
+    def raise_for_status(self):
+        raise requests.exceptions.HTTPError("429 Client Error: Too Many Requests")
+
+
+class HandlerProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.handlers = AssetHandlerFactory._handlers
+        handler = PolygonStockHandler(api_key="test")
+        handler.session.get = lambda *args, **kwargs: RateLimitedResponse()
+        AssetHandlerFactory._handlers = {AssetType.STOCK: handler}
+
+    def tearDown(self):
+        AssetHandlerFactory._handlers = self.handlers
+
+    def test_rate_limited_polygon_counts_as_an_error(self):
+        registry = registry_of(HandlerPriceProvider("polygon", (AssetType.STOCK,)))
+
+        prices, _ = registry.fetch_prices(AssetType.STOCK, ["AAPL"])
+
+        self.assertEqual(prices, {})
+        self.assertEqual(registry.stats["polygon"].error_rate, 1.0)
+        self.assertEqual(registry.stats["polygon"].unknown_symbols, 0)
+
+
+class ProviderStatsTest(unittest.TestCase):
+    def test_latency_is_per_symbol_returned(self):
+        stats = ProviderStats()
+        stats.record_success(2.0, returned=4, requested=10)
+
+        self.assertAlmostEqual(stats.average_latency, 0.5)
+        self.assertEqual(stats.unknown_symbols, 6)
+
+    def test_no_cooldown_below_the_minimum_sample_count(self):
+        stats = ProviderStats(min_samples=3)
+        stats.record_failure()
+        stats.record_failure()
+
+        self.assertTrue(stats.healthy)
+
+    def test_successes_keep_the_error_rate_under_the_limit(self):
+        stats = ProviderStats(max_error_rate=0.5, min_samples=3)
+        for _ in range(3):
+            stats.record_success(1.0, returned=1, requested=1)
+        stats.record_failure()
+
+        self.assertTrue(stats.healthy)
+        self.assertAlmostEqual(stats.error_rate, 0.25)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_calls_are_spaced_by_the_interval(self):
+        limiter = RateLimiter(0.05)
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.wait()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+    def test_refuses_without_reserving_when_the_wait_is_too_long(self):
+        limiter = RateLimiter(10)
+        self.assertTrue(limiter.wait(calls=2, max_wait=1))
+
+        self.assertFalse(limiter.wait(max_wait=1))
+        self.assertFalse(limiter.wait(max_wait=1))
+        self.assertAlmostEqual(limiter._next_slot - time.monotonic(), 20, delta=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
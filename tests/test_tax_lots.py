@@ -0,0 +1,170 @@
+import unittest
+
+from models.tax_lots import Lot, LotBook
+
+
+def book_with_lots(*lots):
+    """Builds a book of AAPL lots given as (quantity, price), oldest first."""
+    book = LotBook()
+    for day, (quantity, price) in enumerate(lots, start=1):
+        book.buy('AAPL', quantity, price, f"2024-01-{day:02d}")
+    return book
+
+
+class LotMatchingTest(unittest.TestCase):
+    def test_fifo_sells_oldest_lots_first(self):
+        book = book_with_lots((10, 100.0), (10, 120.0), (10, 90.0))
+        gains = book.sell('AAPL', 15, 150.0, "2024-02-01", 'fifo')
+
+        self.assertEqual([(gain.quantity, gain.lot.price) for gain in gains],
+                         [(10, 100.0), (5, 120.0)])
+        self.assertAlmostEqual(sum(gain.gain for gain in gains), 15 * 150.0 - (1000.0 + 600.0))
+
+    def test_lifo_sells_newest_lots_first(self):
+        book = book_with_lots((10, 100.0), (10, 120.0), (10, 90.0))
+        gains = book.sell('AAPL', 15, 150.0, "2024-02-01", 'lifo')
+
+        self.assertEqual([(gain.quantity, gain.lot.price) for gain in gains],
+                         [(10, 90.0), (5, 120.0)])
+
+    def test_hifo_sells_most_expensive_lots_first(self):
+        book = book_with_lots((10, 100.0), (10, 120.0), (10, 90.0))
+        gains = book.sell('AAPL', 15, 150.0, "2024-02-01", 'hifo')
+
+        self.assertEqual([(gain.quantity, gain.lot.price) for gain in gains],
+                         [(10, 120.0), (5, 100.0)])
+
+    def test_lots_consumed_by_one_method_are_skipped_by_the_others(self):
+        book = book_with_lots((10, 100.0), (10, 120.0), (10, 90.0))
+        book.sell('AAPL', 10, 150.0, "2024-02-01", 'fifo')
+        book.sell('AAPL', 10, 150.0, "2024-02-02", 'hifo')
+
+        gains = book.sell('AAPL', 10, 150.0, "2024-02-03", 'lifo')
+
+        self.assertEqual([(gain.quantity, gain.lot.price) for gain in gains], [(10, 90.0)])
+        self.assertEqual(book.open_quantity['AAPL'], 0.0)
+
+    def test_partially_sold_lot_keeps_its_place(self):
+        book = book_with_lots((10, 100.0), (10, 120.0))
+        book.sell('AAPL', 4, 150.0, "2024-02-01", 'fifo')
+
+        gains = book.sell('AAPL', 8, 150.0, "2024-02-02", 'fifo')
+
+        self.assertEqual([(gain.quantity, gain.lot.price) for gain in gains],
+                         [(6, 100.0), (2, 120.0)])
+        self.assertEqual(gains[0].lot.remaining, 0.0)
+        self.assertEqual(gains[1].lot.remaining, 8)
+
+    def test_symbols_are_matched_independently(self):
+        book = book_with_lots((10, 100.0))
+        book.buy('BTC', 1, 40000.0, "2024-01-05")
+
+        gains = book.sell('BTC', 1, 50000.0, "2024-02-01")
+
+        self.assertEqual([gain.symbol for gain in gains], ['BTC'])
+        self.assertEqual(book.open_quantity['AAPL'], 10)
+
+    def test_lots_are_aged_by_acquisition_date_not_by_when_they_were_recorded(self):
+        book = book_with_lots((10, 120.0))
+        book.add(Lot(2, 'AAPL', 10, 80.0, "2020-06-01"))
+
+        fifo = book.sell('AAPL', 5, 150.0, "2024-02-01", 'fifo')
+        lifo = book.sell('AAPL', 5, 150.0, "2024-02-02", 'lifo')
+
+        self.assertEqual([gain.lot.price for gain in fifo], [80.0])
+        self.assertEqual([gain.lot.price for gain in lifo], [120.0])
+
+    def test_same_day_lots_fall_back_to_recording_order(self):
+        book = LotBook()
+        book.buy('AAPL', 10, 100.0, "2024-01-01T10:00:00+00:00")
+        book.buy('AAPL', 10, 110.0, "2024-01-01T10:00:00")
+
+        self.assertEqual([gain.lot.price for gain in book.sell('AAPL', 5, 150.0, "2024-02-01", 'fifo')],
+                         [100.0])
+        self.assertEqual([gain.lot.price for gain in book.sell('AAPL', 5, 150.0, "2024-02-01", 'lifo')],
+                         [110.0])
+
+    def test_loaded_lots_resume_from_their_remaining_quantity(self):
+        book = LotBook()
+        book.add(Lot(7, 'AAPL', 10, 100.0, "2024-01-01", remaining=3))
+        book.add(Lot(9, 'AAPL', 10, 120.0, "2024-01-02", remaining=0))
+
+        gains = book.sell('AAPL', 3, 150.0, "2024-02-01")
+
+        self.assertEqual([(gain.lot.seq, gain.quantity) for gain in gains], [(7, 3)])
+        self.assertEqual(book.buy('AAPL', 1, 1.0, "2024-02-02").seq, 8)
+
+
+class LotValidationTest(unittest.TestCase):
+    def test_overselling_raises_and_leaves_the_book_unchanged(self):
+        book = book_with_lots((10, 100.0))
+
+        with self.assertRaises(ValueError):
+            book.sell('AAPL', 10.5, 150.0, "2024-02-01")
+        with self.assertRaises(ValueError):
+            book.sell('MSFT', 1, 150.0, "2024-02-01")
+
+        self.assertEqual(book.open_quantity['AAPL'], 10)
+        self.assertEqual(book.open_cost['AAPL'], 1000.0)
+
+    def test_rejects_unknown_method_and_non_positive_quantities(self):
+        book = book_with_lots((10, 100.0))
+
+        with self.assertRaises(ValueError):
+            book.sell('AAPL', 1, 150.0, "2024-02-01", 'average')
+        with self.assertRaises(ValueError):
+            book.sell('AAPL', 0, 150.0, "2024-02-01")
+        with self.assertRaises(ValueError):
+            book.buy('AAPL', -1, 100.0, "2024-02-01")
+
+
+class FloatEdgeTest(unittest.TestCase):
+    def test_fractional_lots_sell_out_exactly(self):
+        book = LotBook()
+        book.buy('BTC', 0.1, 30000.0, "2024-01-01")
+        book.buy('BTC', 0.2, 40000.0, "2024-01-02")
+
+        gains = book.sell('BTC', 0.3, 50000.0, "2024-02-01")
+
+        self.assertEqual(len(gains), 2)
+        self.assertEqual(book.open_quantity['BTC'], 0.0)
+        self.assertEqual(book.open_cost['BTC'], 0.0)
+        self.assertEqual(book.unrealized({'BTC': 50000.0}), {})
+
+    def test_rounding_residue_does_not_leave_dust_lots(self):
+        book = LotBook()
+        for day in range(1, 11):
+            book.buy('ETH', 0.1, 2000.0, f"2024-01-{day:02d}")
+
+        book.sell('ETH', 1.0, 2500.0, "2024-02-01")
+
+        self.assertEqual(book.open_quantity['ETH'], 0.0)
+        with self.assertRaises(ValueError):
+            book.sell('ETH', 0.1, 2500.0, "2024-02-02")
+
+
+class UnrealizedTest(unittest.TestCase):
+    def test_values_open_quantity_at_current_prices(self):
+        book = book_with_lots((10, 100.0), (10, 120.0))
+        book.sell('AAPL', 10, 150.0, "2024-02-01", 'fifo')
+
+        report = book.unrealized({'AAPL': 130.0})
+
+        self.assertEqual(report['AAPL'], {
+            "quantity": 10,
+            "cost_basis": 1200.0,
+            "market_value": 1300.0,
+            "unrealized_pnl": 100.0,
+        })
+
+    def test_missing_price_leaves_market_value_unknown(self):
+        book = book_with_lots((10, 100.0))
+
+        report = book.unrealized({})
+
+        self.assertIsNone(report['AAPL']['market_value'])
+        self.assertIsNone(report['AAPL']['unrealized_pnl'])
+
+
+if __name__ == '__main__':
+    unittest.main()
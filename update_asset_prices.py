@@ -1,17 +1,106 @@
+import argparse
 import os
 
 from dotenv import load_dotenv
 from models.asset_handlers import AssetHandlerFactory, AssetType
+from models.price_providers import build_default_registry
+from services.price_state import PriceStateStore, price_moved
+from services.update_scheduler import DEFAULT_COST_SECONDS, parse_duration, plan_updates, rank_assets
 from utils.config import supabase
-import requests
+from utils.profiling import profiler, add_profile_arguments
 import time
 
 load_dotenv()
 
-def update_all_asset_prices():
+# Small batches keep priority order and let the deadline cut in between fetches.
+PRICE_BATCH_SIZE = 5
+
+
+def collect_holdings(rows):
+    """
+    Groups portfolio rows by symbol. For every holder of a symbol we keep the
+    aggregated quantity and its value at the currently stored price, which
+    the scheduler uses to rank assets.
+    """
+    holdings = {}
+    for item in rows:
+        entry = holdings.setdefault(item['symbol'], {
+            'asset_type': item['asset_type'],
+            'users': {}
+        })
+        quantity = float(item.get('quantity') or 0)
+        stored_price = float(item.get('current_price') or 0)
+        entry['stored_price'] = item.get('current_price')
+        user_totals = entry['users'].setdefault(item['user_id'], [0.0, 0.0])
+        user_totals[0] += quantity
+        user_totals[1] += quantity * stored_price
+    return holdings
+
+
+def fetch_holdings():
+    response = supabase.table('portfoliosv2').select(
+        'user_id', 'symbol', 'asset_type', 'quantity', 'current_price').execute()
+    return collect_holdings(response.data or [])
+
+
+def write_price(symbol, current_price):
+    """
+    Writes the price to every holding of `symbol`. The summaries trigger on
+    `portfoliosv2` applies the value change to the holders' summaries in the
+    same transaction. The response data is the rows updated.
+    """
+    return supabase.table('portfoliosv2') \
+        .update({'current_price': current_price}) \
+        .eq('symbol', symbol) \
+        .execute()
+
+
+def update_price_batch(registry, batch, state):
+    """Prices a batch of scheduled assets through the provider registry and writes them."""
+    assets_by_type = {}
+    for asset in batch:
+        assets_by_type.setdefault(asset.asset_type, []).append(asset)
+
+    for asset_type_str, assets in assets_by_type.items():
+        asset_type = AssetType(asset_type_str)
+        symbols = [asset.symbol for asset in assets]
+        print(f"  Fetching {asset_type} prices: {', '.join(symbols)}")
+
+        started = time.monotonic()
+        with profiler.phase('fetch_prices'):
+            prices, sources = registry.fetch_prices(asset_type, symbols)
+        state.record_cost(asset_type_str, (time.monotonic() - started) / len(symbols))
+
+        for symbol in symbols:
+            current_price = prices.get(symbol)
+            if current_price is None:
+                print(
+                  f"  Could not fetch price for {symbol}. No provider returned data.")
+                continue
+
+            try:
+                with profiler.phase('db_writes'):
+                    update_response = write_price(symbol, current_price)
+            except Exception as e:
+                print(f"  General error processing {symbol}: {e}")
+                continue
+
+            if not update_response.data:
+                print(f"  Failed to update database for {symbol}: no holdings were updated")
+                continue
+
+            state.record_price(symbol, current_price)
+            state.mark_refreshed(symbol)
+            print(f"  Updated price for {symbol} to {current_price} (via {sources[symbol]})")
+
+
+def update_all_asset_prices(deadline_seconds=None, state_file=None, batch_size=PRICE_BATCH_SIZE):
   """
     Fetches all unique assets from portfolios, updates their prices,
-    and saves them back to the database.
+    and saves them back to the database. Assets are processed by priority
+    (held value and staleness) in small batches routed through the price
+    provider registry; with a deadline, work that does not fit is deferred
+    to the next run and recorded in the state file.
   """
   print("Starting daily asset price update...")
 
@@ -21,112 +110,176 @@ def update_all_asset_prices():
       return
 
   AssetHandlerFactory.initialize(polygon_api_key)
+  registry = build_default_registry()
+  state = PriceStateStore(state_file)
+  deferred = []
+  started = time.monotonic()
 
   try:
-    response = supabase.table('portfoliosv2').select('user_id', 'symbol', 'asset_type').execute()
-    if not response.data:
+    with profiler.phase('fetch_holdings'):
+        holdings = fetch_holdings()
+    if not holdings:
         print("No assets found in portfolios to update.")
         return
-    
-    unique_polygon_assets = {}
-    unique_pokemon_assets = {}
-
-    for item in response.data:
-      symbol = item['symbol']
-      asset_type_str = item['asset_type']
-
-      if asset_type_str == AssetType.STOCK.value or asset_type_str == AssetType.CRYPTO.value:
-        if symbol not in unique_polygon_assets:
-          unique_polygon_assets[symbol] = asset_type_str
-      elif asset_type_str == AssetType.POKEMON.value:
-          if symbol not in unique_pokemon_assets:
-            unique_pokemon_assets[symbol] = asset_type_str
-      else:
-          print(f"Warning: Unknown asset type '{asset_type_str}' for symbol '{symbol}'. Skipping.")
-
-    if unique_pokemon_assets:
-        print("\n--- Updating Pokemon Asset Prices ---")
-        for symbol, asset_type_str in unique_pokemon_assets.items():
-            print(f"  Processing Pokemon: {symbol}")
-            try:
-                handler = AssetHandlerFactory.get_handler(
-                  AssetType.POKEMON)
-                if handler:
-                    current_price = handler.get_current_price(symbol)
-                    if current_price is not None:
-                        update_response = supabase.table('portfoliosv2') \
-                            .update({'current_price': current_price}) \
-                            .eq('symbol', symbol) \
-                            .execute()
-                        if update_response.data:
-                            print(
-                              f"  Updated price for Pokemon {symbol} to {current_price}")
-                        else:
-                            print(
-                              f"  Failed to update price for Pokemon {symbol} in DB: {update_response.status_code}")
-                    else:
-                        print(
-                          f"  Could not fetch price for Pokemon {symbol}.")
-                else:
-                    print(f"  No handler for Pokemon asset type.")
-            except requests.exceptions.RequestException as req_e:
-                print(
-                  f"  Network error fetching price for Pokemon {symbol}: {req_e}")
-            except Exception as e:
-                print(f"  General error processing Pokemon {symbol}: {e}")
 
-        if unique_polygon_assets:
-            print("\n--- Updating Stock/Crypto Prices (with rate limiting) ---")
+    for symbol, holding in holdings.items():
+      if holding['asset_type'] not in DEFAULT_COST_SECONDS:
+          print(f"Warning: Unknown asset type '{holding['asset_type']}' for symbol '{symbol}'. Skipping.")
 
-            # The rate limit is 5 requests per minute, so 1 request every 12 seconds (60/5).
-            delay_between_polygon_calls_seconds = 13
+    if state.deferred:
+        print(f"{len(state.deferred)} assets were deferred by the previous run.")
 
-            for i, (symbol, asset_type_str) in enumerate(unique_polygon_assets.items()):
-                print(
-                  f"  Processing Polygon asset: {symbol} (Type: {asset_type_str})")
-
-                try:
-                    asset_type = AssetType[asset_type_str.upper()]
-                    handler = AssetHandlerFactory.get_handler(asset_type)
-
-                    if handler:
-                        current_price = handler.get_current_price(symbol)
-                        if current_price is not None:
-                            print(
-                              f"  Successfully fetched price for {symbol}: {current_price}")
-                            update_response = supabase.table('portfoliosv2') \
-                                .update({'current_price': current_price}) \
-                                .eq('symbol', symbol) \
-                                .execute()
-                            if update_response.data:
-                                print(f"  Database updated for {symbol}.")
-                            else:
-                                print(
-                                  f"  Failed to update database for {symbol}: {update_response.status_code} - {update_response.data}")
-                        else:
-                            print(
-                              f"  Could not fetch price for {symbol}. API might have returned no data or hit limit.")
-                    else:
-                        print(f"  No handler for asset type: {asset_type_str}")
-                except requests.exceptions.RequestException as req_e:
-                    print(
-                      f"  Network error fetching price for {symbol}: {req_e}")
-                except Exception as e:
-                    print(f"  General error processing {symbol}: {e}")
-
-                if i < len(unique_polygon_assets) - 1:
-                    print(
-                      f"  Pausing for {delay_between_polygon_calls_seconds} seconds to respect API rate limits...")
-                    time.sleep(delay_between_polygon_calls_seconds)
+    ranked = rank_assets(holdings, state)
+    scheduled, deferred = plan_updates(ranked, deadline_seconds)
+    if deferred:
+        print(f"Deferring {len(deferred)} of {len(ranked)} assets to fit the {deadline_seconds:.0f}s budget.")
 
-        else:
-            print("No stock or crypto assets to update.")
+    print("\n--- Updating Asset Prices (highest priority first) ---")
+
+    for start in range(0, len(scheduled), batch_size):
+        batch = scheduled[start:start + batch_size]
+        if deadline_seconds is not None:
+            remaining = deadline_seconds - (time.monotonic() - started)
+            fitting = []
+            for asset in batch:
+                if asset.cost_seconds > remaining:
+                    break
+                fitting.append(asset)
+                remaining -= asset.cost_seconds
+            if len(fitting) < len(batch):
+                print(f"  Deadline reached; deferring the remaining {len(scheduled) - start - len(fitting)} assets.")
+                deferred.extend(scheduled[start + len(fitting):])
+                if fitting:
+                    update_price_batch(registry, fitting, state)
+                break
+
+        update_price_batch(registry, batch, state)
 
   except Exception as e:
     print(f"An unexpected error occurred during price update: {e}")
 
+  for provider in registry.describe():
+      if provider['average_latency'] is not None:
+          print(f"Provider {provider['name']}: {provider['average_latency']:.2f}s/symbol, "
+                f"{provider['error_rate']:.0%} errors{'' if provider['healthy'] else ', cooling down'}")
+
+  state.set_deferred([
+      {'symbol': asset.symbol, 'asset_type': asset.asset_type, 'priority': asset.priority}
+      for asset in deferred
+  ])
+  state.save()
+
   print("Daily asset price update complete.")
 
 
+def refresh_intraday_prices(state, abs_epsilon, rel_epsilon, holdings_max_age):
+    """
+    One intraday pass: pulls stock and crypto prices through Polygon snapshot
+    endpoints and only writes symbols whose price moved past the thresholds.
+    Pokemon prices are skipped since TCGcsv only publishes them once a day.
+    The cached snapshot only decides which symbols to price; summary deltas
+    are computed by the database from the rows as they are at write time.
+    """
+    holdings = state.holdings
+    holdings_age = state.holdings_age()
+    if not holdings or holdings_age is None or holdings_age > holdings_max_age:
+        print("Refreshing holdings snapshot...")
+        with profiler.phase('fetch_holdings'):
+            fetched = fetch_holdings()
+        holdings = {symbol: {'asset_type': holding['asset_type']}
+                    for symbol, holding in fetched.items()}
+        state.set_holdings(holdings)
+        for symbol, holding in fetched.items():
+            state.record_price(symbol, holding.get('stored_price'))
+
+    checked = written = 0
+
+    for asset_type in (AssetType.STOCK, AssetType.CRYPTO):
+        symbols = [symbol for symbol, holding in holdings.items()
+                   if holding['asset_type'] == asset_type.value]
+        if not symbols:
+            continue
+
+        handler = AssetHandlerFactory.get_handler(asset_type)
+        try:
+            with profiler.phase('fetch_prices'):
+                prices = handler.get_snapshot_prices(symbols)
+        except Exception as e:
+            print(f"  Error fetching {asset_type} snapshot: {e}")
+            continue
+
+        for symbol, current_price in prices.items():
+            checked += 1
+            if not price_moved(state.last_price(symbol), current_price, abs_epsilon, rel_epsilon):
+                continue
+
+            try:
+                with profiler.phase('db_writes'):
+                    update_response = write_price(symbol, current_price)
+            except Exception as e:
+                print(f"  Error writing price for {symbol}: {e}")
+                continue
+
+            if update_response.data:
+                written += 1
+                state.record_price(symbol, current_price)
+                print(f"  Updated {symbol} to {current_price}")
+
+    state.save()
+    print(f"Intraday refresh wrote {written} of {checked} priced symbols.")
+
+
+def run_intraday_refresh(abs_epsilon=0.0, rel_epsilon=0.001, interval=0,
+                         holdings_max_age=900, state_file=None):
+    polygon_api_key = os.getenv('POLYGON_API_KEY')
+    if not polygon_api_key:
+        print("POLYGON_API_KEY not found. Please set the environment variable.")
+        return
+
+    AssetHandlerFactory.initialize(polygon_api_key)
+    state = PriceStateStore(state_file)
+
+    while True:
+        try:
+            refresh_intraday_prices(state, abs_epsilon, rel_epsilon, holdings_max_age)
+        except Exception as e:
+            print(f"An unexpected error occurred during intraday refresh: {e}")
+
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Update asset prices in all portfolios.")
+    parser.add_argument('--intraday', action='store_true',
+                        help="Refresh stock/crypto prices from Polygon snapshots, writing only moved symbols.")
+    parser.add_argument('--abs-epsilon', type=float, default=0.0,
+                        help="Absolute price move that triggers a write in intraday mode (0 disables it).")
+    parser.add_argument('--rel-epsilon', type=float, default=0.001,
+                        help="Relative price move that triggers a write in intraday mode (0.001 = 0.1%%, 0 disables it).")
+    parser.add_argument('--interval', type=int, default=0,
+                        help="Seconds between intraday passes; 0 runs a single pass.")
+    parser.add_argument('--holdings-max-age', type=int, default=900,
+                        help="Seconds before the cached holdings snapshot is re-read from the database.")
+    parser.add_argument('--state-file', default=None,
+                        help="Path of the local price state file (default: $PRICE_STATE_FILE or .price_state.json).")
+    parser.add_argument('--deadline', type=parse_duration, default=None,
+                        help="Time budget for the daily update, e.g. 45m or 1h30m. Lower-priority assets that do not fit are deferred.")
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    update_all_asset_prices()
\ No newline at end of file
+    args = parse_args()
+    if args.profile:
+        profiler.enable(args.profile, args.profile_dir, prefix='update')
+    try:
+        if args.intraday:
+            run_intraday_refresh(args.abs_epsilon, args.rel_epsilon, args.interval,
+                                 args.holdings_max_age, args.state_file)
+        else:
+            update_all_asset_prices(args.deadline, args.state_file)
+    finally:
+        for report_path in profiler.write_reports():
+            print(f"Profile written to {report_path}")
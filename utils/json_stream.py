@@ -0,0 +1,109 @@
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Union
+
+_WHITESPACE = ' \t\n\r'
+# Every value we decode sits inside an object or array, so one of these follows it.
+_DELIMITERS = ',]}:'
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """Text buffer fed from byte chunks that drops everything already consumed."""
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self) -> bool:
+        if self.exhausted:
+            return False
+        if self.pos > 65536 or self.pos > len(self.text) // 2:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            self.text += chunk if isinstance(chunk, str) else self._utf8.decode(chunk)
+            return True
+        self.text += self._utf8.decode(b'', final=True)
+        self.exhausted = True
+        return False
+
+    def peek(self) -> str:
+        """Next non-whitespace character, reading more input as needed ('' at the end)."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of JSON stream")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """
+        Decodes the next JSON value. A value is only accepted once the delimiter
+        after it is buffered, so a number split across chunks (e.g. inside its
+        fraction or exponent) is not cut short.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                following = end
+                while following < len(self.text) and self.text[following] in _WHITESPACE:
+                    following += 1
+                if (following < len(self.text) and self.text[following] in _DELIMITERS) \
+                        or self.exhausted:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            self.fill()
+
+
+def iter_json_array_items(chunks: Iterable[Union[bytes, str]], key: str) -> Iterator[Any]:
+    """
+    Yields the elements of the array stored under `key` in a top-level JSON
+    object, decoding one element at a time from `chunks`. Other top-level
+    fields are decoded and discarded. Memory stays bounded by the largest
+    element rather than the whole document, and the caller can stop early.
+    """
+    buffer = _Buffer(chunks)
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+
+    while True:
+        field = buffer.value()
+        buffer.expect(':')
+        if field != key:
+            buffer.value()
+        else:
+            buffer.expect('[')
+            if buffer.peek() == ']':
+                return
+            while True:
+                yield buffer.value()
+                separator = buffer.peek()
+                buffer.pos += 1
+                if separator == ']':
+                    return
+                if separator != ',':
+                    raise ValueError(f"Expected ',' or ']' in '{key}' array of JSON stream")
+
+        separator = buffer.peek()
+        buffer.pos += 1
+        if separator == '}':
+            return
+        if separator != ',':
+            raise ValueError("Expected ',' or '}' in JSON stream")
@@ -0,0 +1,198 @@
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_MODES = ('full', 'sample')
+
+
+class StackSampler(threading.Thread):
+    """
+    Low-overhead statistical profiler: every `interval` seconds it records the
+    target thread's current stack, tagged with the active phase.
+    """
+
+    def __init__(self, profiler, interval: float = 0.01, thread_id: int = None):
+        super().__init__(daemon=True)
+        self.profiler = profiler
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            phase = self.profiler.current_phase or 'other'
+            self.samples[(phase, ';'.join(reversed(stack)))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """
+    Opt-in profiling around named phases. Disabled by default, in which case
+    `phase()` costs next to nothing. In 'full' mode each phase gets its own
+    cProfile profile and memory is tracked with tracemalloc; in 'sample' mode
+    a background thread samples stacks instead and only wall time is recorded,
+    since tracemalloc hooks every allocation.
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.output_dir = None
+        self.prefix = None
+        self.phase_stack = []
+        self.profiles = {}
+        self.phase_times = Counter()
+        self.phase_peaks = {}
+        # Highest peak seen by each open phase before a nested phase reset it.
+        self.peak_stack = []
+        self.track_memory = False
+        self.sampler = None
+        self.start_snapshot = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    @property
+    def current_phase(self):
+        return self.phase_stack[-1] if self.phase_stack else None
+
+    def enable(self, mode: str = 'full', output_dir: str = 'profiles', prefix: str = 'run'):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'. Expected one of: {', '.join(PROFILE_MODES)}")
+
+        self.mode = mode
+        self.output_dir = output_dir
+        self.prefix = f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}"
+        self.track_memory = mode == 'full'
+        if self.track_memory:
+            tracemalloc.start(25)
+            self.start_snapshot = tracemalloc.take_snapshot()
+
+        if mode == 'sample':
+            self.sampler = StackSampler(self)
+            self.sampler.start()
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        outer = self.current_phase
+        if self.mode == 'full' and outer:
+            self.profiles[outer].disable()
+        self.phase_stack.append(name)
+        profile = None
+        if self.mode == 'full':
+            profile = self.profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+        if self.track_memory:
+            if self.peak_stack:
+                self.peak_stack[-1] = max(self.peak_stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.peak_stack.append(0)
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phase_times[name] += time.perf_counter() - started
+            if self.track_memory:
+                peak = max(self.peak_stack.pop(), tracemalloc.get_traced_memory()[1])
+                self.phase_peaks[name] = max(self.phase_peaks.get(name, 0), peak)
+                if self.peak_stack:
+                    self.peak_stack[-1] = max(self.peak_stack[-1], peak)
+            if profile:
+                profile.disable()
+            self.phase_stack.pop()
+            if self.mode == 'full' and outer:
+                self.profiles[outer].enable()
+
+    def write_reports(self, top: int = 30):
+        if not self.enabled:
+            return []
+
+        if self.sampler:
+            self.sampler.stop()
+        os.makedirs(self.output_dir, exist_ok=True)
+        written = []
+
+        for name, profile in self.profiles.items():
+            base_path = os.path.join(self.output_dir, f"{self.prefix}-{name}")
+            profile.dump_stats(f"{base_path}.prof")
+            report = io.StringIO()
+            pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(top)
+            with open(f"{base_path}.txt", 'w') as f:
+                f.write(report.getvalue())
+            written.append(f"{base_path}.txt")
+
+        if self.sampler:
+            path = os.path.join(self.output_dir, f"{self.prefix}-samples.txt")
+            with open(path, 'w') as f:
+                # One "phase;frame;frame count" line per stack, ready for flamegraph tools.
+                for (phase, stack), count in self.sampler.samples.most_common():
+                    f.write(f"{phase};{stack} {count}\n")
+            written.append(path)
+
+        if self.track_memory:
+            written.append(self._write_memory_report(top))
+        else:
+            path = os.path.join(self.output_dir, f"{self.prefix}-timings.txt")
+            with open(path, 'w') as f:
+                f.write("Phase timings\n")
+                for name, seconds in self.phase_times.most_common():
+                    f.write(f"  {name}: {seconds:.3f}s\n")
+            written.append(path)
+
+        self.mode = None
+        return written
+
+    def _write_memory_report(self, top: int) -> str:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        path = os.path.join(self.output_dir, f"{self.prefix}-memory.txt")
+        with open(path, 'w') as f:
+            f.write("Phase timings and peak traced memory\n")
+            for name, seconds in self.phase_times.most_common():
+                f.write(f"  {name}: {seconds:.3f}s, peak {self.phase_peaks[name] / 1024:.1f} KiB\n")
+            f.write(f"\nOverall peak traced memory: {peak / 1024:.1f} KiB\n")
+
+            f.write(f"\nTop {top} allocation sites still held\n")
+            for stat in snapshot.statistics('lineno')[:top]:
+                f.write(f"  {stat}\n")
+
+            f.write(f"\nTop {top} allocation changes since profiling started\n")
+            for stat in snapshot.compare_to(self.start_snapshot, 'lineno')[:top]:
+                f.write(f"  {stat}\n")
+        return path
+
+
+# Shared instance so any module can mark phases without threading it through.
+profiler = Profiler()
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', nargs='?', const='full', choices=PROFILE_MODES,
+                        help="Profile the main phases: 'full' uses cProfile, 'sample' a low-overhead stack sampler.")
+    parser.add_argument('--profile-dir', default='profiles',
+                        help="Directory for profiling reports (default: profiles).")